@@ -0,0 +1,295 @@
+import calendar
+import datetime
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
+from config import Config
+from database import execute_one
+
+GRANULARITIES = ('day', 'week', 'month')
+
+# group_by -> (SQL izraz za grupu, dodatni JOIN)
+GROUP_BY = {
+    'none': ("'ukupno'", ''),
+    'mechanic': ("COALESCE(m.username, 'nedodijeljeno')", ''),
+    'brand': ('v.brand', ''),
+    # Segment po broju ranijih završenih naloga kupca - ne mijenja se naknadno,
+    # pa zatvoreni periodi ostaju valjani u cacheu
+    'segment': (
+        """CASE
+               WHEN prior.orders = 0 THEN 'novi'
+               WHEN prior.orders < 4 THEN 'povratni'
+               ELSE 'vjerni'
+           END""",
+        """LEFT JOIN LATERAL (
+               SELECT COUNT(*) as orders
+               FROM (
+                   SELECT p.completed_at FROM work_orders p
+                   JOIN vehicles pv ON p.vehicle_id = pv.vehicle_id
+                   WHERE pv.owner_id = v.owner_id AND p.status = 'completed'
+                   UNION ALL
+                   SELECT p.completed_at FROM work_orders_archive p
+                   JOIN vehicles pv ON p.vehicle_id = pv.vehicle_id
+                   WHERE pv.owner_id = v.owner_id AND p.status = 'completed'
+               ) p
+               WHERE p.completed_at < o.completed_at
+           ) prior ON true"""
+    ),
+}
+
+# Stupčani izvadak - jedan red s poljima umjesto reda po nalogu.
+# Arhivirani nalozi ulaze u izvještaj jednako kao živi.
+EXTRACT_QUERY = """
+    WITH orders AS (
+        SELECT work_order_id, vehicle_id, assigned_mechanic_id, actual_cost, completed_at
+        FROM work_orders
+        WHERE status = 'completed' AND completed_at >= %(start)s AND completed_at < %(end)s
+        UNION ALL
+        SELECT work_order_id, vehicle_id, assigned_mechanic_id, actual_cost, completed_at
+        FROM work_orders_archive
+        WHERE status = 'completed' AND completed_at >= %(start)s AND completed_at < %(end)s
+    ),
+    hours AS (
+        SELECT work_order_id, SUM(hours_worked) as hours_worked
+        FROM (
+            SELECT work_order_id, hours_worked FROM work_log
+            WHERE work_order_id IN (SELECT work_order_id FROM orders)
+            UNION ALL
+            SELECT work_order_id, hours_worked FROM work_log_archive
+            WHERE work_order_id IN (SELECT work_order_id FROM orders)
+        ) wl
+        GROUP BY work_order_id
+    )
+    SELECT
+        COALESCE(array_agg(EXTRACT(EPOCH FROM o.completed_at)::float8), '{{}}') as completed,
+        COALESCE(array_agg(COALESCE(o.actual_cost, 0)::float8), '{{}}') as revenue,
+        COALESCE(array_agg(COALESCE(h.hours_worked, 0)::float8), '{{}}') as hours,
+        COALESCE(array_agg({group}), '{{}}') as groups
+    FROM orders o
+    JOIN vehicles v ON o.vehicle_id = v.vehicle_id
+    LEFT JOIN users m ON o.assigned_mechanic_id = m.user_id
+    LEFT JOIN hours h ON o.work_order_id = h.work_order_id
+    {join}
+"""
+
+# BUCKETS
+
+def bucket_floor(dt, granularity):
+    day = datetime.datetime(dt.year, dt.month, dt.day)
+    if granularity == 'week':
+        return day - datetime.timedelta(days=day.weekday())
+    if granularity == 'month':
+        return day.replace(day=1)
+    return day
+
+def bucket_next(start, granularity):
+    if granularity == 'week':
+        return start + datetime.timedelta(days=7)
+    if granularity == 'month':
+        return (start.replace(day=28) + datetime.timedelta(days=4)).replace(day=1)
+    return start + datetime.timedelta(days=1)
+
+def bucket_prev(start, granularity):
+    if granularity == 'week':
+        return start - datetime.timedelta(days=7)
+    if granularity == 'month':
+        return (start - datetime.timedelta(days=1)).replace(day=1)
+    return start - datetime.timedelta(days=1)
+
+def bucket_range(date_from, date_to, granularity):
+    starts = []
+    start = bucket_floor(date_from, granularity)
+    while start.date() <= date_to:
+        starts.append(start)
+        if len(starts) > Config.ANALYTICS_MAX_BUCKETS:
+            raise ValueError(f'Raspon je prevelik (najviše {Config.ANALYTICS_MAX_BUCKETS} perioda)')
+        start = bucket_next(start, granularity)
+    return starts
+
+def epoch(dt):
+    return calendar.timegm(dt.timetuple())
+
+# CACHE
+
+class BucketCache:
+    def __init__(self, max_size):
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._max_size = max_size
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def put(self, key, value, ttl):
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._max_size:
+                self._entries.popitem(last=False)
+
+
+bucket_cache = BucketCache(Config.ANALYTICS_CACHE_SIZE)
+
+def extract(start, end, group_by):
+    group, join = GROUP_BY[group_by]
+    row = execute_one(EXTRACT_QUERY.format(group=group, join=join), {'start': start, 'end': end})
+    return (
+        np.asarray(row['completed'], dtype=np.float64),
+        np.asarray(row['revenue'], dtype=np.float64),
+        np.asarray(row['hours'], dtype=np.float64),
+        np.asarray(row['groups'], dtype=object)
+    )
+
+def aggregate(starts, end, granularity, group_by):
+    completed, revenue, hours, groups = extract(starts[0], end, group_by)
+
+    edges = np.array([epoch(s) for s in starts] + [epoch(end)], dtype=np.float64)
+    bucket_idx = np.searchsorted(edges, completed, side='right') - 1
+    names, group_idx = np.unique(groups.astype(str), return_inverse=True)
+
+    size = len(starts) * len(names)
+    flat = bucket_idx * len(names) + group_idx
+    shape = (len(starts), len(names))
+    totals = (
+        np.bincount(flat, weights=revenue, minlength=size).reshape(shape),
+        np.bincount(flat, minlength=size).reshape(shape),
+        np.bincount(flat, weights=hours, minlength=size).reshape(shape),
+    )
+
+    buckets = []
+    for b in range(len(starts)):
+        present = np.nonzero(totals[1][b])[0]
+        buckets.append({
+            str(names[g]): (float(totals[0][b, g]), int(totals[1][b, g]), float(totals[2][b, g]))
+            for g in present
+        })
+    return buckets
+
+# Zatvoreni periodi dolaze iz cachea, ponovno se računa samo tekući
+# (i oni kojima je istekao TTL) - susjedni nedostajući periodi idu jednim upitom
+def load_buckets(starts, granularity, group_by):
+    now = datetime.datetime.now()
+    ends = [bucket_next(s, granularity) for s in starts]
+    result = [bucket_cache.get((granularity, group_by, s)) for s in starts]
+
+    i = 0
+    while i < len(starts):
+        if result[i] is not None:
+            i += 1
+            continue
+        j = i
+        while j < len(starts) and result[j] is None:
+            j += 1
+
+        for k, bucket in enumerate(aggregate(starts[i:j], ends[j - 1], granularity, group_by), start=i):
+            result[k] = bucket
+            if ends[k] <= now:
+                bucket_cache.put((granularity, group_by, starts[k]), bucket, Config.ANALYTICS_CLOSED_BUCKET_TTL)
+        i = j
+
+    return result
+
+def to_matrix(buckets, names):
+    index = {name: g for g, name in enumerate(names)}
+    matrix = np.zeros((3, len(names), len(buckets)))
+    for b, bucket in enumerate(buckets):
+        for name, values in bucket.items():
+            matrix[:, index[name], b] = values
+    return matrix
+
+def moving_average(series, window):
+    cumulative = np.cumsum(np.pad(series, ((0, 0), (1, 0))), axis=1)
+    averages = np.full(series.shape, np.nan)
+    if window <= series.shape[1]:
+        averages[:, window - 1:] = (cumulative[:, window:] - cumulative[:, :-window]) / window
+    return averages
+
+def summarize(revenue, jobs, hours):
+    return {
+        'revenue': round(float(revenue), 2),
+        'jobs': int(jobs),
+        'hours': round(float(hours), 2),
+        'avg_job_value': round(float(revenue / jobs), 2) if jobs else None,
+        'revenue_per_hour': round(float(revenue / hours), 2) if hours else None
+    }
+
+def change(current, previous):
+    if not previous:
+        return None
+    return round(float((current - previous) / previous * 100), 1)
+
+def rounded(values):
+    return [None if np.isnan(v) else round(float(v), 2) for v in values]
+
+def revenue_report(date_from, date_to, granularity='day', group_by='none', window=None, compare=False):
+    starts = bucket_range(date_from, date_to, granularity)
+    buckets = load_buckets(starts, granularity, group_by)
+
+    previous = None
+    if compare:
+        # Prethodni period iste duljine (isti broj perioda neposredno prije)
+        previous_starts = [bucket_prev(starts[0], granularity)]
+        while len(previous_starts) < len(starts):
+            previous_starts.insert(0, bucket_prev(previous_starts[0], granularity))
+        previous = load_buckets(previous_starts, granularity, group_by)
+
+    names = sorted({name for bucket in buckets + (previous or []) for name in bucket})
+    matrix = to_matrix(buckets, names)
+    averages = moving_average(matrix[0], window) if window else None
+    group_totals = matrix.sum(axis=2)
+    overall = group_totals.sum(axis=1)
+
+    if previous is not None:
+        previous_totals = to_matrix(previous, names).sum(axis=2)
+        previous_overall = previous_totals.sum(axis=1)
+
+    series = []
+    for g, name in enumerate(names):
+        entry = {
+            'group': name,
+            'revenue': rounded(matrix[0, g]),
+            'jobs': [int(v) for v in matrix[1, g]],
+            'hours': rounded(matrix[2, g]),
+            'totals': summarize(*group_totals[:, g])
+        }
+        if averages is not None:
+            entry['revenue_moving_avg'] = rounded(averages[g])
+        if previous is not None:
+            entry['previous_totals'] = summarize(*previous_totals[:, g])
+            entry['revenue_change_pct'] = change(group_totals[0, g], previous_totals[0, g])
+        series.append(entry)
+
+    report = {
+        # Raspon je proširen na cijele periode
+        'from': starts[0].date().isoformat(),
+        'to': (bucket_next(starts[-1], granularity) - datetime.timedelta(days=1)).date().isoformat(),
+        'granularity': granularity,
+        'group_by': group_by,
+        'buckets': [s.date().isoformat() for s in starts],
+        'series': series,
+        'totals': summarize(*overall)
+    }
+    if window:
+        report['moving_average_window'] = window
+    if previous is not None:
+        report['previous'] = {
+            'from': previous_starts[0].date().isoformat(),
+            'to': (bucket_next(previous_starts[-1], granularity) - datetime.timedelta(days=1)).date().isoformat(),
+            'totals': summarize(*previous_overall)
+        }
+        report['change_pct'] = {
+            'revenue': change(overall[0], previous_overall[0]),
+            'jobs': change(overall[1], previous_overall[1]),
+            'hours': change(overall[2], previous_overall[2])
+        }
+    return report
@@ -1,14 +1,59 @@
-from flask import Flask, jsonify, request
+from flask import Flask, Response, jsonify, request, stream_with_context
 from flask_cors import CORS
-from database import execute_query, execute_one, get_db_connection
-from auth_helper import generate_token, require_auth, get_current_user
+from database import execute_query, execute_one, get_db_connection, router, prepared_stats
+from auth_helper import generate_token, decode_token, require_auth, get_current_user, revoke_session
+from config import Config
+from scheduler import scheduler, OPEN_STATUSES, AssignmentConflict
+from events import broker, visibility_filter
+from rate_limit import limiter
+from idempotency import idempotent
+import compression
+import archive
+import analytics
 import psycopg2
+import base64
+import datetime
+import uuid
 
 app = Flask(__name__)
 CORS(app)
+limiter.init_app(app)
+compression.init_app(app)
+
+# FIELDSETS
+
+# ?fields=a,b,c - sužava SQL projekciju na dopuštene stupce (ime -> SQL izraz)
+def parse_fields(whitelist):
+    raw = request.args.get('fields')
+    if not raw:
+        return list(whitelist)
+
+    fields = [f.strip() for f in raw.split(',') if f.strip()]
+    unknown = [f for f in fields if f not in whitelist]
+    if unknown or not fields:
+        raise ValueError(f"Nepoznata polja: {', '.join(unknown)}")
+    return fields
+
+def projection(whitelist, fields):
+    return ', '.join(
+        whitelist[f] if whitelist[f] == f else f"{whitelist[f]} as {f}"
+        for f in fields
+    )
+
+# PAGINATION
+
+# Keyset kursor (timestamp, id) kao neprozirni base64 string
+def encode_cursor(timestamp, key):
+    raw = f"{timestamp.isoformat()}|{key}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def decode_cursor(cursor):
+    timestamp, key = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+    return datetime.datetime.fromisoformat(timestamp), key
 
 # AUTH
 @app.route('/api/auth/login', methods=['POST'])
+@limiter.limit('login')
 def login():
     data = request.json
     username = data.get('username')
@@ -27,7 +72,7 @@ def login():
         GROUP BY u.user_id
     """
     
-    user = execute_one(query, (password, username))
+    user = execute_one(query, (password, username), prepare=True)
     
     if not user or not user['password_valid']:
         return jsonify({'error': 'Invalid credentials'}), 401
@@ -35,18 +80,21 @@ def login():
     if user['status'] != 'active':
         return jsonify({'error': 'Account is not active'}), 403
 
-    token = generate_token(user['user_id'])
-
     conn = get_db_connection()
     try:
         with conn.cursor() as cursor:
             cursor.execute("""
                 INSERT INTO sessions (user_id, ip_address, user_agent, expires_at)
-                VALUES (%s, %s, %s, NOW() + INTERVAL '24 hours')
-            """, (user['user_id'], request.remote_addr, request.user_agent.string))
+                VALUES (%s, %s, %s, NOW() + %s * INTERVAL '1 hour')
+                RETURNING session_id
+            """, (user['user_id'], request.remote_addr, request.user_agent.string, Config.JWT_EXPIRATION_HOURS))
+            session_id = cursor.fetchone()['session_id']
             conn.commit()
     finally:
         conn.close()
+
+    # sid veže token uz sesiju - deaktivirana sesija poništava token
+    token = generate_token(user['user_id'], session_id)
     
     return jsonify({
         'token': token,
@@ -71,6 +119,12 @@ def get_me():
     })
 
 # USERS
+
+USER_FIELDS = {f: f for f in [
+    'user_id', 'username', 'email', 'status',
+    'roles', 'highest_priority', 'role_count', 'last_login'
+]}
+
 @app.route('/api/users', methods=['GET'])
 @require_auth
 def get_users():
@@ -79,21 +133,27 @@ def get_users():
     user_roles = [r for r in user_roles if r is not None]
     if 'owner' not in user_roles:
         return jsonify({'error': 'Niste autorizirani za ovu operaciju'}), 403
-    
-    query = """
-        SELECT user_id, username, email, status, 
-               roles, highest_priority, role_count, last_login
+
+    try:
+        fields = parse_fields(USER_FIELDS)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    query = f"""
+        SELECT {projection(USER_FIELDS, fields)}
         FROM user_roles_summary
         ORDER BY highest_priority, username
     """
     users = execute_query(query)
     for user in users:
-        user['user_id'] = str(user['user_id'])
+        if 'user_id' in user:
+            user['user_id'] = str(user['user_id'])
     
     return jsonify(users)
 
 @app.route('/api/users', methods=['POST'])
 @require_auth
+@idempotent
 def create_user():
     user = get_current_user()
     user_roles = user.get('roles', []) or []
@@ -198,6 +258,17 @@ def get_user_permissions_endpoint(user_id):
 
 # VEHICLES
 
+VEHICLE_FIELDS = {
+    'vehicle_id': 'v.vehicle_id',
+    'license_plate': 'v.license_plate',
+    'brand': 'v.brand',
+    'model': 'v.model',
+    'year': 'v.year',
+    'vin': 'v.vin',
+    'owner_name': 'u.username',
+    'owner_email': 'u.email'
+}
+
 @app.route('/api/vehicles', methods=['GET'])
 @require_auth
 def get_vehicles():
@@ -206,33 +277,32 @@ def get_vehicles():
     user_roles = user.get('roles', []) or []
     user_roles = [r for r in user_roles if r is not None]
 
+    try:
+        fields = parse_fields(VEHICLE_FIELDS)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    query = f"SELECT {projection(VEHICLE_FIELDS, fields)} FROM vehicles v"
+    # owner_id je NOT NULL pa se JOIN smije preskočiti kad podaci vlasnika nisu traženi
+    if 'owner_name' in fields or 'owner_email' in fields:
+        query += " JOIN users u ON v.owner_id = u.user_id"
+
     if 'owner' in user_roles or 'receptionist' in user_roles or 'mechanic' in user_roles or 'head_mechanic' in user_roles:
-        query = """
-            SELECT v.vehicle_id, v.license_plate, v.brand, v.model, v.year, v.vin,
-                   u.username as owner_name, u.email as owner_email
-            FROM vehicles v
-            JOIN users u ON v.owner_id = u.user_id
-            ORDER BY v.created_at DESC
-        """
+        query += " ORDER BY v.created_at DESC"
         vehicles = execute_query(query)
     else:
-        query = """
-            SELECT v.vehicle_id, v.license_plate, v.brand, v.model, v.year, v.vin,
-                   u.username as owner_name, u.email as owner_email
-            FROM vehicles v
-            JOIN users u ON v.owner_id = u.user_id
-            WHERE v.owner_id = %s
-            ORDER BY v.created_at DESC
-        """
+        query += " WHERE v.owner_id = %s ORDER BY v.created_at DESC"
         vehicles = execute_query(query, (user_id,))
     
     for vehicle in vehicles:
-        vehicle['vehicle_id'] = str(vehicle['vehicle_id'])
+        if 'vehicle_id' in vehicle:
+            vehicle['vehicle_id'] = str(vehicle['vehicle_id'])
     
     return jsonify(vehicles)
 
 @app.route('/api/vehicles', methods=['POST'])
 @require_auth
+@idempotent
 def create_vehicle():
     user = get_current_user()
     user_id = user['user_id']
@@ -272,6 +342,30 @@ def create_vehicle():
 
 # WORK ORDERS
 
+WORK_ORDER_FIELDS = {f: f for f in [
+    'work_order_id', 'status', 'description', 'estimated_cost', 'actual_cost',
+    'created_at', 'started_at', 'completed_at',
+    'license_plate', 'brand', 'model', 'year',
+    'customer_name', 'customer_email', 'mechanic_id', 'mechanic_name',
+    'completion_days', 'has_invoice'
+]}
+
+WORK_ORDER_SECTIONS = ('logs', 'invoice')
+
+# Ugniježđena vremena dolaze kao to_char stringovi (a iznosi kao ::text) - vremena se
+# vraćaju u datetime da ih jsonify formatira isto kao polja samog naloga.
+# Fiksni format jer fromisoformat prije Pythona 3.11 ne prima proizvoljan broj decimala
+EMBEDDED_TIMESTAMP_FORMAT = '%Y-%m-%dT%H:%M:%S.%f'
+
+def embedded_formats(order):
+    for log in order.get('work_logs') or []:
+        log['timestamp'] = datetime.datetime.strptime(log['timestamp'], EMBEDDED_TIMESTAMP_FORMAT)
+    invoice = order.get('invoice')
+    if invoice:
+        for key in ('issued_at', 'paid_at'):
+            if invoice[key]:
+                invoice[key] = datetime.datetime.strptime(invoice[key], EMBEDDED_TIMESTAMP_FORMAT)
+
 @app.route('/api/work-orders', methods=['GET'])
 @require_auth
 def get_work_orders():
@@ -280,108 +374,125 @@ def get_work_orders():
     user_roles = user.get('roles', []) or []
     user_roles = [r for r in user_roles if r is not None]
 
+    try:
+        fields = parse_fields(WORK_ORDER_FIELDS)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    query = f"SELECT {projection(WORK_ORDER_FIELDS, fields)} FROM work_orders_detailed"
+    # Priprema se samo zadana projekcija - kombinacije ?fields= bi punile registar naredbi
+    prepare = fields == list(WORK_ORDER_FIELDS)
+
     if 'owner' in user_roles or 'receptionist' in user_roles or 'head_mechanic' in user_roles:
-        query = """
-            SELECT work_order_id, status, description, estimated_cost, actual_cost,
-                   created_at, started_at, completed_at,
-                   license_plate, brand, model, year,
-                   customer_name, customer_email, mechanic_id, mechanic_name,
-                   completion_days, has_invoice
-            FROM work_orders_detailed
-            ORDER BY created_at DESC
-        """
-        orders = execute_query(query)
+        query += " ORDER BY created_at DESC"
+        orders = execute_query(query, prepare=prepare)
     elif 'mechanic' in user_roles:
-        query = """
-            SELECT work_order_id, status, description, estimated_cost, actual_cost,
-                   created_at, started_at, completed_at,
-                   license_plate, brand, model, year,
-                   customer_name, customer_email, mechanic_id, mechanic_name,
-                   completion_days, has_invoice
-            FROM work_orders_detailed
-            WHERE mechanic_id = %s
-            ORDER BY created_at DESC
-        """
-        orders = execute_query(query, (user_id,))
+        query += " WHERE mechanic_id = %s ORDER BY created_at DESC"
+        orders = execute_query(query, (user_id,), prepare=prepare)
     elif 'customer' in user_roles:
-        query = """
-            SELECT wo.work_order_id, wo.status, wo.description, wo.estimated_cost, wo.actual_cost,
-                   wo.created_at, wo.started_at, wo.completed_at,
-                   v.license_plate, v.brand, v.model, v.year,
-                   u.username as customer_name, u.email as customer_email,
-                   m.user_id as mechanic_id, m.username as mechanic_name,
-                   CASE 
-                       WHEN wo.completed_at IS NOT NULL THEN 
-                           EXTRACT(EPOCH FROM (wo.completed_at - wo.created_at)) / 86400
-                       ELSE NULL
-                   END as completion_days,
-                   EXISTS(SELECT 1 FROM invoices i WHERE i.work_order_id = wo.work_order_id) as has_invoice
-            FROM work_orders wo
-            JOIN vehicles v ON wo.vehicle_id = v.vehicle_id
-            JOIN users u ON v.owner_id = u.user_id
-            LEFT JOIN users m ON wo.assigned_mechanic_id = m.user_id
-            WHERE v.owner_id = %s
-            ORDER BY wo.created_at DESC
-        """
-        orders = execute_query(query, (user_id,))
+        query += " WHERE customer_id = %s ORDER BY created_at DESC"
+        orders = execute_query(query, (user_id,), prepare=prepare)
     else:
         orders = []
     
     for order in orders:
-        order['work_order_id'] = str(order['work_order_id'])
+        if 'work_order_id' in order:
+            order['work_order_id'] = str(order['work_order_id'])
     
     return jsonify(orders)
 
 @app.route('/api/work-orders/<order_id>', methods=['GET'])
 @require_auth
 def get_work_order(order_id):
-    user = get_current_user()
-    user_id = user['user_id']
-    user_roles = user.get('roles', []) or []
-    user_roles = [r for r in user_roles if r is not None]
-    
+    include = request.args.get('include', ','.join(WORK_ORDER_SECTIONS))
+    sections = {s.strip() for s in include.split(',') if s.strip()}
+    unknown = sections - set(WORK_ORDER_SECTIONS)
+    if unknown:
+        return jsonify({'error': f"Nepoznati include: {', '.join(sorted(unknown))}"}), 400
+
+    # Uloge, nalog, provjera vidljivosti, zapisi i račun u jednom upitu
     query = """
-        SELECT work_order_id, status, description, estimated_cost, actual_cost,
-               created_at, started_at, completed_at,
-               license_plate, brand, model, year,
-               customer_id, customer_name, customer_email,
-               mechanic_id, mechanic_name
-        FROM work_orders_detailed
-        WHERE work_order_id = %s
+        WITH me AS (
+            SELECT COALESCE(ARRAY_AGG(r.role_name), '{}') as roles
+            FROM user_roles ur
+            JOIN roles r ON ur.role_id = r.role_id
+            WHERE ur.user_id = %(user_id)s
+        ),
+        wo AS (
+            SELECT d.*,
+                   COALESCE(CASE
+                       WHEN 'owner' = ANY(me.roles) THEN true
+                       WHEN 'mechanic' = ANY(me.roles) THEN d.mechanic_id = %(user_id)s::uuid
+                       WHEN 'customer' = ANY(me.roles) THEN d.customer_id = %(user_id)s::uuid
+                       ELSE true
+                   END, false) as visible
+            FROM work_orders_detailed d
+            CROSS JOIN me
+            WHERE d.work_order_id = %(order_id)s
+        )
+        SELECT wo.work_order_id, wo.status, wo.description, wo.estimated_cost, wo.actual_cost,
+               wo.created_at, wo.started_at, wo.completed_at,
+               wo.license_plate, wo.brand, wo.model, wo.year,
+               wo.customer_id, wo.customer_name, wo.customer_email,
+               wo.mechanic_id, wo.mechanic_name,
+               wo.visible,
+               CASE WHEN wo.visible AND %(logs)s THEN (
+                   SELECT COALESCE(json_agg(json_build_object(
+                              'log_id', wl.log_id,
+                              'log_entry', wl.log_entry,
+                              'hours_worked', wl.hours_worked::text,
+                              'timestamp', to_char(wl.timestamp, 'YYYY-MM-DD"T"HH24:MI:SS.US'),
+                              'mechanic_name', u.username
+                          ) ORDER BY wl.timestamp DESC), '[]'::json)
+                   FROM work_log wl
+                   JOIN users u ON wl.mechanic_id = u.user_id
+                   WHERE wl.work_order_id = wo.work_order_id
+               ) END as work_logs,
+               CASE WHEN wo.visible AND %(invoice)s THEN (
+                   SELECT json_build_object(
+                              'invoice_id', i.invoice_id,
+                              'invoice_number', i.invoice_number,
+                              'status', i.status,
+                              'total_amount', i.total_amount::text,
+                              'tax_amount', i.tax_amount::text,
+                              'issued_at', to_char(i.issued_at, 'YYYY-MM-DD"T"HH24:MI:SS.US'),
+                              'paid_at', to_char(i.paid_at, 'YYYY-MM-DD"T"HH24:MI:SS.US')
+                          )
+                   FROM invoices i
+                   WHERE i.work_order_id = wo.work_order_id
+               ) END as invoice
+        FROM wo
     """
-    order = execute_one(query, (order_id,))
-    
+    order = execute_one(query, {
+        'user_id': request.user_id,
+        'order_id': order_id,
+        'logs': 'logs' in sections,
+        'invoice': 'invoice' in sections
+    }, prepare=True)
+
     if not order:
         return jsonify({'error': 'Work order not found'}), 404
 
-    if 'mechanic' in user_roles and not 'owner' in user_roles:
-        if str(order['mechanic_id']) != str(user_id):
-            return jsonify({'error': 'Niste autorizirani'}), 403
-    elif 'customer' in user_roles and not 'owner' in user_roles:
-        if str(order['customer_id']) != str(user_id):
-            return jsonify({'error': 'Niste autorizirani'}), 403
-    
+    if not order.pop('visible'):
+        return jsonify({'error': 'Niste autorizirani'}), 403
+
     order['work_order_id'] = str(order['work_order_id'])
     if order['customer_id']:
         order['customer_id'] = str(order['customer_id'])
     if order['mechanic_id']:
         order['mechanic_id'] = str(order['mechanic_id'])
 
-    logs_query = """
-        SELECT log_id, log_entry, hours_worked, timestamp,
-               u.username as mechanic_name
-        FROM work_log wl
-        JOIN users u ON wl.mechanic_id = u.user_id
-        WHERE wl.work_order_id = %s
-        ORDER BY timestamp DESC
-    """
-    logs = execute_query(logs_query, (order_id,))
-    order['work_logs'] = logs
-    
+    if 'logs' not in sections:
+        del order['work_logs']
+    if 'invoice' not in sections:
+        del order['invoice']
+    embedded_formats(order)
+
     return jsonify(order)
 
 @app.route('/api/work-orders', methods=['POST'])
 @require_auth
+@idempotent
 def create_work_order():
     user = get_current_user()
     user_roles = user.get('roles', []) or []
@@ -410,11 +521,13 @@ def create_work_order():
             order_id = cursor.fetchone()['work_order_id']
             conn.commit()
         conn.close()
-        
-        return jsonify({'work_order_id': str(order_id), 'message': 'Radni nalog kreiran'}), 201
     except Exception as e:
         return jsonify({'error': str(e)}), 400
 
+    scheduler.order_changed(order_id)
+
+    return jsonify({'work_order_id': str(order_id), 'message': 'Radni nalog kreiran'}), 201
+
 @app.route('/api/work-orders/<order_id>/status', methods=['PUT'])
 @require_auth
 def update_work_order_status(order_id):
@@ -437,11 +550,13 @@ def update_work_order_status(order_id):
             """, (new_status, order_id))
             conn.commit()
         conn.close()
-        
-        return jsonify({'message': 'Status ažuriran'})
     except Exception as e:
         return jsonify({'error': str(e)}), 400
 
+    scheduler.order_changed(order_id)
+
+    return jsonify({'message': 'Status ažuriran'})
+
 @app.route('/api/work-orders/<order_id>/mechanic', methods=['PUT'])
 @require_auth
 def assign_mechanic(order_id):
@@ -464,13 +579,71 @@ def assign_mechanic(order_id):
             """, (mechanic_id, order_id))
             conn.commit()
         conn.close()
-        
-        return jsonify({'message': 'Mehaničar dodijeljen'})
     except Exception as e:
         return jsonify({'error': str(e)}), 400
 
+    scheduler.order_changed(order_id)
+
+    return jsonify({'message': 'Mehaničar dodijeljen'})
+
+@app.route('/api/work-orders/<order_id>/auto-assign', methods=['POST'])
+@require_auth
+def auto_assign_mechanic(order_id):
+    user = get_current_user()
+    user_roles = user.get('roles', []) or []
+    user_roles = [r for r in user_roles if r is not None]
+    if not any(role in user_roles for role in ['owner', 'receptionist', 'head_mechanic']):
+        return jsonify({'error': 'Niste autorizirani za ovu operaciju'}), 403
+
+    query = """
+        SELECT work_order_id, status, assigned_mechanic_id, estimated_cost
+        FROM work_orders
+        WHERE work_order_id = %s
+    """
+    order = execute_one(query, (order_id,))
+
+    if not order:
+        return jsonify({'error': 'Work order not found'}), 404
+    if order['status'] not in OPEN_STATUSES:
+        return jsonify({'error': 'Radni nalog nije otvoren'}), 400
+    if order['assigned_mechanic_id']:
+        return jsonify({'error': 'Radni nalog već ima mehaničara'}), 409
+
+    try:
+        mechanic_id = scheduler.auto_assign(order)
+    except AssignmentConflict as e:
+        return jsonify({'error': str(e)}), 409
+    except Exception as e:
+        return jsonify({'error': str(e)}), 400
+
+    if not mechanic_id:
+        return jsonify({'error': 'Nema dostupnih mehaničara'}), 409
+
+    return jsonify({'mechanic_id': mechanic_id, 'message': 'Mehaničar dodijeljen'})
+
+@app.route('/api/work-orders/auto-assign', methods=['POST'])
+@limiter.limit('heavy')
+@require_auth
+def auto_assign_pending():
+    user = get_current_user()
+    user_roles = user.get('roles', []) or []
+    user_roles = [r for r in user_roles if r is not None]
+    if not any(role in user_roles for role in ['owner', 'receptionist', 'head_mechanic']):
+        return jsonify({'error': 'Niste autorizirani za ovu operaciju'}), 403
+
+    try:
+        plan = scheduler.auto_assign_pending()
+    except Exception as e:
+        return jsonify({'error': str(e)}), 400
+
+    return jsonify({
+        'assigned': [{'work_order_id': o, 'mechanic_id': m} for o, m in plan],
+        'workload': scheduler.workload()
+    })
+
 @app.route('/api/work-orders/<order_id>/logs', methods=['POST'])
 @require_auth
+@idempotent
 def add_work_log(order_id):
     user = get_current_user()
     user_id = user['user_id']
@@ -501,11 +674,13 @@ def add_work_log(order_id):
             ))
             conn.commit()
         conn.close()
-        
-        return jsonify({'message': 'Zapis dodan'}), 201
     except Exception as e:
         return jsonify({'error': str(e)}), 400
 
+    scheduler.order_changed(order_id)
+
+    return jsonify({'message': 'Zapis dodan'}), 201
+
 # ROLES
 
 @app.route('/api/roles', methods=['GET'])
@@ -518,6 +693,7 @@ def get_roles():
 # STATISTICS
 
 @app.route('/api/stats/dashboard', methods=['GET'])
+@limiter.limit('heavy')
 @require_auth
 def get_dashboard_stats():
     user = get_current_user()
@@ -580,6 +756,17 @@ def get_mechanics():
     
     return jsonify(mechanics)
 
+@app.route('/api/mechanics/workload', methods=['GET'])
+@require_auth
+def get_mechanics_workload():
+    user = get_current_user()
+    user_roles = user.get('roles', []) or []
+    user_roles = [r for r in user_roles if r is not None]
+    if not any(role in user_roles for role in ['owner', 'receptionist', 'head_mechanic']):
+        return jsonify({'error': 'Niste autorizirani'}), 403
+
+    return jsonify(scheduler.workload())
+
 @app.route('/api/customers', methods=['GET'])
 @require_auth
 def get_customers():
@@ -599,8 +786,142 @@ def get_customers():
 
     return jsonify(customers)
 
+# SEARCH
+
+def escape_like(value):
+    return value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+@app.route('/api/search', methods=['GET'])
+@limiter.limit('search')
+@require_auth
+def search():
+    user = get_current_user()
+    user_id = user['user_id']
+    user_roles = user.get('roles', []) or []
+    user_roles = [r for r in user_roles if r is not None]
+
+    term = (request.args.get('q') or '').strip()
+    if len(term) < Config.SEARCH_MIN_QUERY_LENGTH:
+        return jsonify({'error': f'Upit mora imati barem {Config.SEARCH_MIN_QUERY_LENGTH} znaka'}), 400
+
+    limit = request.args.get('limit', Config.SEARCH_DEFAULT_LIMIT, type=int)
+    limit = max(1, min(limit, Config.SEARCH_MAX_LIMIT))
+
+    params = {
+        'q': term,
+        'prefix': escape_like(term) + '%',
+        'contains': '%' + escape_like(term) + '%',
+        'limit': limit,
+        'user_id': user_id
+    }
+
+    # Uzorak %ab% nema nijedan trigram pa GIN indeks ne može filtrirati -
+    # kraći upiti koriste samo prefiks i similarity uvjete
+    infix = len(term) >= Config.SEARCH_MIN_INFIX_LENGTH
+
+    is_staff = any(role in user_roles for role in ['owner', 'receptionist', 'mechanic', 'head_mechanic'])
+    sees_all_orders = any(role in user_roles for role in ['owner', 'receptionist', 'head_mechanic'])
+
+    # Svi uvjeti koriste trigram (pg_trgm) GIN indekse - ILIKE i % / <% operatore
+    vehicles_query = f"""
+        SELECT v.vehicle_id, v.license_plate, v.brand, v.model, v.year, v.vin,
+               u.username as owner_name,
+               GREATEST(
+                   CASE WHEN v.license_plate ILIKE %(prefix)s OR v.vin ILIKE %(prefix)s THEN 1 ELSE 0 END,
+                   similarity(v.license_plate, %(q)s),
+                   similarity(COALESCE(v.vin, ''), %(q)s),
+                   word_similarity(%(q)s, v.brand || ' ' || v.model)
+               ) as score
+        FROM vehicles v
+        JOIN users u ON v.owner_id = u.user_id
+        WHERE (v.license_plate ILIKE %(prefix)s OR v.license_plate %% %(q)s
+               OR v.vin ILIKE %(prefix)s OR v.vin %% %(q)s
+               OR %(q)s <%% (v.brand || ' ' || v.model)
+               {"OR (v.brand || ' ' || v.model) ILIKE %(contains)s" if infix else ''})
+    """
+    if not is_staff:
+        vehicles_query += " AND v.owner_id = %(user_id)s"
+    vehicles_query += " ORDER BY score DESC, v.license_plate LIMIT %(limit)s"
+
+    customers_query = f"""
+        SELECT u.user_id, u.username, u.email, u.phone,
+               GREATEST(
+                   CASE WHEN u.username ILIKE %(prefix)s OR u.email ILIKE %(prefix)s
+                             OR u.phone ILIKE %(prefix)s THEN 1 ELSE 0 END,
+                   word_similarity(%(q)s, u.username),
+                   word_similarity(%(q)s, u.email)
+               ) as score
+        FROM users u
+        WHERE (u.username ILIKE %(prefix)s OR %(q)s <%% u.username
+               OR u.email ILIKE %(prefix)s OR %(q)s <%% u.email
+               OR u.phone ILIKE {'%(contains)s' if infix else '%(prefix)s'})
+          AND EXISTS (
+              SELECT 1
+              FROM user_roles ur
+              JOIN roles r ON ur.role_id = r.role_id
+              WHERE ur.user_id = u.user_id AND r.role_name = 'customer'
+          )
+        ORDER BY score DESC, u.username
+        LIMIT %(limit)s
+    """
+
+    orders_query = f"""
+        SELECT wo.work_order_id, wo.status, wo.description, wo.created_at,
+               v.license_plate, v.brand, v.model,
+               GREATEST(
+                   CASE WHEN wo.description ILIKE %(contains)s THEN 1 ELSE 0 END,
+                   word_similarity(%(q)s, wo.description)
+               ) as score
+        FROM work_orders wo
+        JOIN vehicles v ON wo.vehicle_id = v.vehicle_id
+        WHERE (%(q)s <%% wo.description
+               {'OR wo.description ILIKE %(contains)s' if infix else ''})
+    """
+    if not sees_all_orders:
+        if 'mechanic' in user_roles:
+            orders_query += " AND wo.assigned_mechanic_id = %(user_id)s"
+        else:
+            orders_query += " AND v.owner_id = %(user_id)s"
+    orders_query += " ORDER BY score DESC, wo.created_at DESC LIMIT %(limit)s"
+
+    conn = get_db_connection(readonly=True)
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(vehicles_query, params)
+            vehicles = cursor.fetchall()
+
+            customers = []
+            if is_staff:
+                cursor.execute(customers_query, params)
+                customers = cursor.fetchall()
+
+            cursor.execute(orders_query, params)
+            orders = cursor.fetchall()
+    finally:
+        conn.close()
+
+    for v in vehicles:
+        v['vehicle_id'] = str(v['vehicle_id'])
+    for c in customers:
+        c['user_id'] = str(c['user_id'])
+    for o in orders:
+        o['work_order_id'] = str(o['work_order_id'])
+
+    return jsonify({
+        'query': term,
+        'vehicles': vehicles,
+        'customers': customers,
+        'work_orders': orders
+    })
+
 # INVOICES
 
+INVOICE_FIELDS = {f: f for f in [
+    'invoice_id', 'invoice_number', 'status', 'total_amount', 'tax_amount',
+    'issued_at', 'paid_at', 'customer_name', 'customer_email',
+    'work_order_id', 'work_description', 'license_plate', 'days_overdue'
+]}
+
 @app.route('/api/invoices', methods=['GET'])
 @require_auth
 def get_invoices():
@@ -609,18 +930,18 @@ def get_invoices():
     user_roles = user.get('roles', []) or []
     user_roles = [r for r in user_roles if r is not None]
 
+    try:
+        fields = parse_fields(INVOICE_FIELDS)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    query = f"SELECT {projection(INVOICE_FIELDS, fields)} FROM invoice_summary"
+
     if any(role in user_roles for role in ['owner', 'accountant', 'receptionist']):
-        query = """
-            SELECT * FROM invoice_summary
-            ORDER BY issued_at DESC
-        """
+        query += " ORDER BY issued_at DESC"
         invoices = execute_query(query)
     elif 'customer' in user_roles:
-        query = """
-            SELECT invoice_id, invoice_number, status, total_amount, tax_amount,
-                   issued_at, paid_at, customer_name, customer_email,
-                   work_order_id, work_description, license_plate, days_overdue
-            FROM invoice_summary
+        query += """
             WHERE customer_email = (SELECT email FROM users WHERE user_id = %s)
             ORDER BY issued_at DESC
         """
@@ -663,6 +984,72 @@ def mark_invoice_paid(invoice_id):
 
 # AUDIT LOG
 
+def query_audit_log(args, record_id=None):
+    limit = args.get('limit', Config.AUDIT_DEFAULT_PAGE_SIZE, type=int)
+    limit = max(1, min(limit, Config.AUDIT_MAX_PAGE_SIZE))
+
+    conditions = []
+    params = []
+
+    # Svaki filter odgovara vodećem stupcu jednog od kompozitnih indeksa
+    # (x, timestamp, log_id) pa keyset uvjet i sortiranje idu po indeksu
+    record_id = record_id or args.get('record_id')
+    if record_id:
+        conditions.append('al.record_id = %s')
+        params.append(str(uuid.UUID(record_id)))
+
+    if args.get('user_id'):
+        conditions.append('al.user_id = %s')
+        params.append(str(uuid.UUID(args['user_id'])))
+
+    if args.get('table_name'):
+        conditions.append('al.table_name = %s')
+        params.append(args['table_name'])
+
+    if args.get('action_type'):
+        conditions.append('al.action_type = %s')
+        params.append(args['action_type'])
+
+    if args.get('from'):
+        conditions.append('al.timestamp >= %s')
+        params.append(datetime.datetime.fromisoformat(args['from']))
+
+    if args.get('to'):
+        conditions.append('al.timestamp < %s')
+        params.append(datetime.datetime.fromisoformat(args['to']))
+
+    if args.get('cursor'):
+        conditions.append('(al.timestamp, al.log_id) < (%s, %s)')
+        timestamp, log_id = decode_cursor(args['cursor'])
+        params.extend([timestamp, int(log_id)])
+
+    query = """
+        SELECT al.log_id, al.timestamp, al.action_type, al.table_name, al.record_id,
+               al.user_id, u.username, u.email, al.ip_address,
+               al.old_value, al.new_value
+        FROM audit_log al
+        LEFT JOIN users u ON al.user_id = u.user_id
+    """
+    if conditions:
+        query += " WHERE " + " AND ".join(conditions)
+    query += " ORDER BY al.timestamp DESC, al.log_id DESC LIMIT %s"
+    params.append(limit + 1)
+
+    logs = execute_query(query, params)
+
+    next_cursor = None
+    if len(logs) > limit:
+        logs = logs[:limit]
+        next_cursor = encode_cursor(logs[-1]['timestamp'], logs[-1]['log_id'])
+
+    for log in logs:
+        if log['record_id']:
+            log['record_id'] = str(log['record_id'])
+        if log['user_id']:
+            log['user_id'] = str(log['user_id'])
+
+    return {'items': logs, 'next_cursor': next_cursor}
+
 @app.route('/api/audit-log', methods=['GET'])
 @require_auth
 def get_audit_log():
@@ -673,28 +1060,40 @@ def get_audit_log():
     if not any(role in user_roles for role in ['owner', 'head_mechanic']):
         return jsonify({'error': 'Niste autorizirani'}), 403
 
-    limit = request.args.get('limit', 100, type=int)
-    table_name = request.args.get('table_name')
-    action_type = request.args.get('action_type')
-
-    query = "SELECT * FROM audit_trail WHERE 1=1"
-    params = []
+    try:
+        return jsonify(query_audit_log(request.args))
+    except ValueError as e:
+        return jsonify({'error': f'Neispravan filter: {e}'}), 400
 
-    if table_name:
-        query += " AND table_name = %s"
-        params.append(table_name)
+@app.route('/api/audit-log/records/<record_id>', methods=['GET'])
+@require_auth
+def get_record_history(record_id):
+    user = get_current_user()
+    user_roles = user.get('roles', []) or []
+    user_roles = [r for r in user_roles if r is not None]
 
-    if action_type:
-        query += " AND action_type = %s"
-        params.append(action_type)
+    if not any(role in user_roles for role in ['owner', 'head_mechanic']):
+        return jsonify({'error': 'Niste autorizirani'}), 403
 
-    query += f" ORDER BY timestamp DESC LIMIT {limit}"
+    try:
+        return jsonify(query_audit_log(request.args, record_id=record_id))
+    except ValueError as e:
+        return jsonify({'error': f'Neispravan filter: {e}'}), 400
 
-    logs = execute_query(query, params if params else None)
+# SESSIONS
 
-    return jsonify(logs)
+ALL_SESSION_FIELDS = {f: f for f in [
+    'session_id', 'username', 'email', 'ip_address',
+    'created_at', 'expires_at', 'minutes_until_expiry', 'roles'
+]}
 
-# SESSIONS
+OWN_SESSION_FIELDS = {
+    'session_id': 'session_id',
+    'ip_address': 'ip_address',
+    'created_at': 'created_at',
+    'expires_at': 'expires_at',
+    'minutes_until_expiry': 'EXTRACT(EPOCH FROM (expires_at - CURRENT_TIMESTAMP)) / 60'
+}
 
 @app.route('/api/sessions', methods=['GET'])
 @require_auth
@@ -704,13 +1103,18 @@ def get_sessions():
     user_roles = user.get('roles', []) or []
     user_roles = [r for r in user_roles if r is not None]
 
+    whitelist = ALL_SESSION_FIELDS if 'owner' in user_roles else OWN_SESSION_FIELDS
+    try:
+        fields = parse_fields(whitelist)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
     if 'owner' in user_roles:
-        query = "SELECT * FROM active_sessions ORDER BY created_at DESC"
+        query = f"SELECT {projection(whitelist, fields)} FROM active_sessions ORDER BY created_at DESC"
         sessions = execute_query(query)
     else:
-        query = """
-            SELECT session_id, ip_address, created_at, expires_at,
-                   EXTRACT(EPOCH FROM (expires_at - CURRENT_TIMESTAMP)) / 60 as minutes_until_expiry
+        query = f"""
+            SELECT {projection(whitelist, fields)}
             FROM sessions
             WHERE user_id = %s AND is_active = true AND expires_at > CURRENT_TIMESTAMP
             ORDER BY created_at DESC
@@ -747,14 +1151,180 @@ def delete_session(session_id):
             """, (session_id,))
             conn.commit()
         conn.close()
+        revoke_session(session_id)
 
         return jsonify({'message': 'Sesija deaktivirana'})
     except Exception as e:
         return jsonify({'error': str(e)}), 400
 
+# ARCHIVE
+
+def archive_visibility(user_id, user_roles):
+    if any(role in user_roles for role in ['owner', 'receptionist', 'head_mechanic', 'accountant']):
+        return '', []
+    if 'mechanic' in user_roles:
+        return ' AND mechanic_id = %s', [user_id]
+    return ' AND customer_id = %s', [user_id]
+
+@app.route('/api/archive/work-orders', methods=['GET'])
+@require_auth
+def get_archived_work_orders():
+    user = get_current_user()
+    user_id = user['user_id']
+    user_roles = user.get('roles', []) or []
+    user_roles = [r for r in user_roles if r is not None]
+
+    limit = request.args.get('limit', Config.ARCHIVE_DEFAULT_PAGE_SIZE, type=int)
+    limit = max(1, min(limit, Config.ARCHIVE_MAX_PAGE_SIZE))
+
+    query = """
+        SELECT work_order_id, status, description, estimated_cost, actual_cost,
+               created_at, completed_at, archived_at,
+               vehicle_id, license_plate, brand, model, year,
+               customer_id, customer_name, customer_email,
+               mechanic_id, mechanic_name
+        FROM work_orders_archive_detailed
+        WHERE true
+    """
+    visibility, params = archive_visibility(user_id, user_roles)
+    query += visibility
+
+    try:
+        if request.args.get('vehicle_id'):
+            query += " AND vehicle_id = %s"
+            params.append(str(uuid.UUID(request.args['vehicle_id'])))
+
+        if request.args.get('customer_id'):
+            query += " AND customer_id = %s"
+            params.append(str(uuid.UUID(request.args['customer_id'])))
+
+        if request.args.get('license_plate'):
+            query += " AND license_plate = %s"
+            params.append(request.args['license_plate'])
+
+        if request.args.get('cursor'):
+            completed_at, order_key = decode_cursor(request.args['cursor'])
+            query += " AND (completed_at, work_order_id) < (%s, %s)"
+            params.extend([completed_at, str(uuid.UUID(order_key))])
+    except ValueError as e:
+        return jsonify({'error': f'Neispravan filter: {e}'}), 400
+
+    query += " ORDER BY completed_at DESC, work_order_id DESC LIMIT %s"
+    params.append(limit + 1)
+
+    orders = execute_query(query, params)
+
+    next_cursor = None
+    if len(orders) > limit:
+        orders = orders[:limit]
+        next_cursor = encode_cursor(orders[-1]['completed_at'], orders[-1]['work_order_id'])
+
+    for order in orders:
+        for key in ('work_order_id', 'vehicle_id', 'customer_id', 'mechanic_id'):
+            if order[key]:
+                order[key] = str(order[key])
+
+    return jsonify({'items': orders, 'next_cursor': next_cursor})
+
+@app.route('/api/archive/work-orders/<order_id>', methods=['GET'])
+@require_auth
+def get_archived_work_order(order_id):
+    user = get_current_user()
+    user_id = user['user_id']
+    user_roles = user.get('roles', []) or []
+    user_roles = [r for r in user_roles if r is not None]
+
+    visibility, params = archive_visibility(user_id, user_roles)
+    query = f"""
+        SELECT wo.*,
+               (
+                   SELECT COALESCE(json_agg(json_build_object(
+                              'log_id', wl.log_id,
+                              'log_entry', wl.log_entry,
+                              'hours_worked', wl.hours_worked::text,
+                              'timestamp', to_char(wl.timestamp, 'YYYY-MM-DD"T"HH24:MI:SS.US'),
+                              'mechanic_name', u.username
+                          ) ORDER BY wl.timestamp DESC), '[]'::json)
+                   FROM work_log_archive wl
+                   LEFT JOIN users u ON wl.mechanic_id = u.user_id
+                   WHERE wl.work_order_id = wo.work_order_id
+               ) as work_logs,
+               (
+                   SELECT json_build_object(
+                              'invoice_id', i.invoice_id,
+                              'invoice_number', i.invoice_number,
+                              'status', i.status,
+                              'total_amount', i.total_amount::text,
+                              'tax_amount', i.tax_amount::text,
+                              'issued_at', to_char(i.issued_at, 'YYYY-MM-DD"T"HH24:MI:SS.US'),
+                              'paid_at', to_char(i.paid_at, 'YYYY-MM-DD"T"HH24:MI:SS.US')
+                          )
+                   FROM invoices_archive i
+                   WHERE i.work_order_id = wo.work_order_id
+               ) as invoice
+        FROM work_orders_archive_detailed wo
+        WHERE work_order_id = %s {visibility}
+    """
+    order = execute_one(query, [order_id] + params)
+
+    if not order:
+        return jsonify({'error': 'Work order not found'}), 404
+
+    for key in ('work_order_id', 'vehicle_id', 'customer_id', 'mechanic_id'):
+        if order[key]:
+            order[key] = str(order[key])
+    embedded_formats(order)
+
+    return jsonify(order)
+
+@app.route('/api/archive/work-orders/<order_id>/restore', methods=['POST'])
+@require_auth
+def restore_archived_work_order(order_id):
+    user = get_current_user()
+    user_roles = user.get('roles', []) or []
+    user_roles = [r for r in user_roles if r is not None]
+
+    if 'owner' not in user_roles:
+        return jsonify({'error': 'Niste autorizirani za ovu operaciju'}), 403
+
+    try:
+        restored = archive.restore_work_order(order_id, request.user_id)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 400
+
+    if not restored:
+        return jsonify({'error': 'Work order not found'}), 404
+
+    return jsonify({'message': 'Radni nalog vraćen iz arhive'})
+
+@app.route('/api/archive/run', methods=['POST'])
+@limiter.limit('heavy')
+@require_auth
+def run_archival():
+    user = get_current_user()
+    user_roles = user.get('roles', []) or []
+    user_roles = [r for r in user_roles if r is not None]
+
+    if 'owner' not in user_roles:
+        return jsonify({'error': 'Niste autorizirani za ovu operaciju'}), 403
+
+    data = request.get_json(silent=True) or {}
+
+    try:
+        result = archive.run_archival(
+            older_than_days=data.get('older_than_days'),
+            batch_size=data.get('batch_size'),
+            max_batches=data.get('max_batches')
+        )
+    except Exception as e:
+        return jsonify({'error': str(e)}), 400
+
+    return jsonify(result)
+
 # CUSTOMER DASHBOARD
 
 @app.route('/api/stats/customer-dashboard', methods=['GET'])
+@limiter.limit('heavy')
 @require_auth
 def get_customer_dashboard():
     user = get_current_user()
@@ -791,6 +1361,7 @@ def get_customer_dashboard():
 # MECHANIC DASHBOARD
 
 @app.route('/api/stats/mechanic-dashboard', methods=['GET'])
+@limiter.limit('heavy')
 @require_auth
 def get_mechanic_dashboard():
     user = get_current_user()
@@ -818,13 +1389,97 @@ def get_mechanic_dashboard():
 
     return jsonify(stats)
 
+# ANALYTICS
+
+@app.route('/api/analytics/revenue', methods=['GET'])
+@limiter.limit('heavy')
+@require_auth
+def get_revenue_analytics():
+    user = get_current_user()
+    user_roles = user.get('roles', []) or []
+    user_roles = [r for r in user_roles if r is not None]
+
+    if not any(role in user_roles for role in ['owner', 'accountant']):
+        return jsonify({'error': 'Niste autorizirani'}), 403
+
+    granularity = request.args.get('granularity', 'day')
+    if granularity not in analytics.GRANULARITIES:
+        return jsonify({'error': f"granularity mora biti jedno od: {', '.join(analytics.GRANULARITIES)}"}), 400
+
+    group_by = request.args.get('group_by', 'none')
+    if group_by not in analytics.GROUP_BY:
+        return jsonify({'error': f"group_by mora biti jedno od: {', '.join(analytics.GROUP_BY)}"}), 400
+
+    try:
+        date_to = datetime.date.fromisoformat(request.args['to']) if request.args.get('to') else datetime.date.today()
+        date_from = (
+            datetime.date.fromisoformat(request.args['from']) if request.args.get('from')
+            else date_to - datetime.timedelta(days=Config.ANALYTICS_DEFAULT_DAYS - 1)
+        )
+        window = int(request.args['moving_average']) if request.args.get('moving_average') else None
+    except ValueError:
+        return jsonify({'error': 'Neispravan parametar (datumi YYYY-MM-DD, moving_average cijeli broj)'}), 400
+
+    if date_from > date_to:
+        return jsonify({'error': 'from mora biti prije to'}), 400
+    if window is not None and not 1 <= window <= Config.ANALYTICS_MAX_WINDOW:
+        return jsonify({'error': f'moving_average mora biti između 1 i {Config.ANALYTICS_MAX_WINDOW}'}), 400
+
+    compare = request.args.get('compare', '').lower() in ('1', 'true', 'yes')
+
+    try:
+        report = analytics.revenue_report(date_from, date_to, granularity, group_by, window, compare)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    return jsonify(report)
+
+# EVENTS
+
+@app.route('/api/events', methods=['GET'])
+@limiter.exempt
+def events():
+    # EventSource ne može slati headere pa je token dopušten i kao query parametar
+    token = request.headers.get('Authorization') or request.args.get('token')
+
+    if not token:
+        return jsonify({'error': 'Token is missing'}), 401
+
+    if token.startswith('Bearer '):
+        token = token[7:]
+
+    payload = decode_token(token)
+    if not payload:
+        return jsonify({'error': 'Invalid or expired token'}), 401
+
+    request.user_id = payload['user_id']
+    user = get_current_user()
+    user_roles = user.get('roles', []) or []
+    user_roles = [r for r in user_roles if r is not None]
+
+    subscription = broker.subscribe(visibility_filter(user['user_id'], user_roles))
+
+    return Response(
+        stream_with_context(broker.stream(subscription)),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
 # HEALTH CHECK
 
 @app.route('/api/health', methods=['GET'])
+@limiter.exempt
 def health_check():
     try:
-        execute_one("SELECT 1")
-        return jsonify({'status': 'healthy', 'database': 'connected'})
+        # Uvijek provjerava primary, stanje replika se samo prijavljuje
+        conn = get_db_connection()
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT 1")
+        finally:
+            conn.close()
+        return jsonify({'status': 'healthy', 'database': 'connected', 'replicas': router.status(),
+                        'prepared_statements': prepared_stats.snapshot()})
     except Exception as e:
         return jsonify({'status': 'unhealthy', 'error': str(e)}), 500
 
@@ -0,0 +1,59 @@
+import datetime
+from config import Config
+from database import get_primary_connection
+
+def positive_int(name, value, default):
+    if value is None:
+        return default
+    # Negativan older_than_days bi arhivirao i danas završene naloge
+    if isinstance(value, bool) or not isinstance(value, int) or value < 1:
+        raise ValueError(f'{name} mora biti pozitivan cijeli broj')
+    return value
+
+# Svaka serija je zasebna transakcija - kratki lockovi, napredak se ne gubi
+def run_archival(older_than_days=None, batch_size=None, max_batches=None):
+    older_than = datetime.timedelta(
+        days=positive_int('older_than_days', older_than_days, Config.ARCHIVE_AFTER_DAYS)
+    )
+    batch_size = positive_int('batch_size', batch_size, Config.ARCHIVE_BATCH_SIZE)
+    max_batches = positive_int('max_batches', max_batches, Config.ARCHIVE_MAX_BATCHES)
+
+    archived = 0
+    batches = 0
+    conn = get_primary_connection()
+    try:
+        while batches < max_batches:
+            with conn.cursor() as cursor:
+                cursor.execute(
+                    "SELECT archive_work_orders(%s, %s) as count",
+                    (older_than, batch_size)
+                )
+                count = cursor.fetchone()['count']
+            conn.commit()
+
+            batches += 1
+            archived += count
+            if count < batch_size:
+                break
+    finally:
+        conn.close()
+
+    return {'archived': archived, 'batches': batches}
+
+def restore_work_order(work_order_id, restored_by):
+    conn = get_primary_connection()
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(
+                "SELECT restore_archived_work_order(%s, %s) as restored",
+                (work_order_id, restored_by)
+            )
+            restored = cursor.fetchone()['restored']
+        conn.commit()
+    finally:
+        conn.close()
+    return restored
+
+if __name__ == '__main__':
+    # Za cron: python archive.py
+    print(run_archival())
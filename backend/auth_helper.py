@@ -1,25 +1,119 @@
 import jwt
 import datetime
+import hashlib
+import threading
+import time
+from collections import OrderedDict
 from functools import wraps
 from flask import request, jsonify
+import psycopg2
 from config import Config
 from database import execute_one
 
-def generate_token(user_id):
+def generate_token(user_id, session_id=None):
     payload = {
         'user_id': str(user_id),
         'exp': datetime.datetime.utcnow() + datetime.timedelta(hours=Config.JWT_EXPIRATION_HOURS)
     }
-    return jwt.encode(payload, Config.SECRET_KEY, algorithm='HS256')
+    if session_id:
+        payload['sid'] = str(session_id)
+    return jwt.encode(
+        payload,
+        Config.JWT_KEYS[Config.JWT_ACTIVE_KID],
+        algorithm=Config.JWT_ALGORITHM,
+        headers={'kid': Config.JWT_ACTIVE_KID}
+    )
 
-def decode_token(token):
+# TOKEN CACHE
+
+class TokenCache:
+    def __init__(self, max_size):
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._max_size = max_size
+
+    def get(self, digest):
+        with self._lock:
+            entry = self._entries.get(digest)
+            if entry:
+                self._entries.move_to_end(digest)
+            return entry
+
+    def put(self, digest, payload, checked_at):
+        with self._lock:
+            self._entries[digest] = (payload, checked_at)
+            self._entries.move_to_end(digest)
+            while len(self._entries) > self._max_size:
+                self._entries.popitem(last=False)
+
+    def discard(self, digest):
+        with self._lock:
+            self._entries.pop(digest, None)
+
+    def forget_session(self, session_id):
+        with self._lock:
+            for digest, (payload, _) in list(self._entries.items()):
+                if payload.get('sid') == session_id:
+                    del self._entries[digest]
+
+
+token_cache = TokenCache(Config.TOKEN_CACHE_SIZE)
+
+def session_active(session_id):
+    result = execute_one("""
+        SELECT is_active AND expires_at > CURRENT_TIMESTAMP as active
+        FROM sessions
+        WHERE session_id = %s
+    """, (session_id,), prepare=True)
+    return bool(result and result['active'])
+
+def verify_token(token):
     try:
-        return jwt.decode(token, Config.SECRET_KEY, algorithms=['HS256'])
+        kid = jwt.get_unverified_header(token).get('kid', 'default')
+        key = Config.JWT_KEYS.get(kid)
+        if key is None:
+            return None
+        # Algoritam dolazi iz konfiguracije, nikad iz zaglavlja tokena
+        return jwt.decode(token, key, algorithms=Config.JWT_ALGORITHMS, options={'require': ['exp']})
     except jwt.ExpiredSignatureError:
         return None
     except jwt.InvalidTokenError:
         return None
 
+def decode_token(token):
+    digest = hashlib.sha256(token.encode()).digest()
+    now = time.time()
+
+    entry = token_cache.get(digest)
+    if entry:
+        payload, checked_at = entry
+        if payload['exp'] <= now:
+            token_cache.discard(digest)
+            return None
+    else:
+        payload = verify_token(token)
+        if payload is None:
+            return None
+        checked_at = None
+
+    # Revokacija sesije na drugom workeru vidi se najkasnije nakon REVALIDATE sekundi
+    if 'sid' in payload and (checked_at is None or now - checked_at > Config.TOKEN_CACHE_REVALIDATE_SECONDS):
+        try:
+            active = session_active(payload['sid'])
+        except psycopg2.Error:
+            # Baza nedostupna - već provjereni token vrijedi dok se ne uspije provjeriti
+            return dict(payload) if checked_at is not None else None
+        if not active:
+            token_cache.discard(digest)
+            return None
+        checked_at = now
+
+    token_cache.put(digest, payload, checked_at or now)
+    return dict(payload)
+
+def revoke_session(session_id):
+    token_cache.forget_session(str(session_id))
+
 def require_auth(f):
     @wraps(f)
     def decorated(*args, **kwargs):
@@ -52,7 +146,7 @@ def get_current_user():
         WHERE u.user_id = %s
         GROUP BY u.user_id
     """
-    return execute_one(query, (user_id,))
+    return execute_one(query, (user_id,), prepare=True)
 
 def require_permission(resource_type, action):
     def decorator(f):
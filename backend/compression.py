@@ -0,0 +1,62 @@
+import gzip
+from flask import request
+from config import Config
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+def accepted_encodings(header):
+    encodings = {}
+    for part in header.split(','):
+        name, _, params = part.strip().partition(';')
+        quality = 1.0
+        if params.strip().startswith('q='):
+            try:
+                quality = float(params.strip()[2:])
+            except ValueError:
+                quality = 0.0
+        if name:
+            encodings[name.lower()] = quality
+    return encodings
+
+
+def choose_encoding(header):
+    encodings = accepted_encodings(header)
+    candidates = ['br', 'gzip'] if brotli else ['gzip']
+    candidates = [c for c in candidates if encodings.get(c, encodings.get('*', 0)) > 0]
+    if not candidates:
+        return None
+    return max(candidates, key=lambda c: encodings.get(c, encodings.get('*', 0)))
+
+
+def compress_response(response):
+    response.vary.add('Accept-Encoding')
+
+    if (response.direct_passthrough or response.is_streamed
+            or 'Content-Encoding' in response.headers
+            or response.status_code < 200 or response.status_code == 204):
+        return response
+
+    encoding = choose_encoding(request.headers.get('Accept-Encoding', ''))
+    if not encoding:
+        return response
+
+    data = response.get_data()
+    if len(data) < Config.COMPRESSION_MIN_SIZE:
+        return response
+
+    if encoding == 'br':
+        data = brotli.compress(data, quality=Config.COMPRESSION_BROTLI_QUALITY)
+    else:
+        data = gzip.compress(data, compresslevel=Config.COMPRESSION_GZIP_LEVEL)
+
+    response.set_data(data)
+    response.headers['Content-Encoding'] = encoding
+    return response
+
+
+def init_app(app):
+    app.after_request(compress_response)
@@ -13,4 +13,96 @@ class Config:
     DB_USER = os.getenv('DB_USER', 'cuki')
     DB_PASSWORD = os.getenv('DB_PASSWORD', '')
 
-    JWT_EXPIRATION_HOURS = 24
\ No newline at end of file
+    # Read replike - libpq DSN-ovi odvojeni zarezom
+    DB_REPLICA_DSNS = [dsn.strip() for dsn in os.getenv('DB_REPLICA_DSNS', '').split(',') if dsn.strip()]
+    DB_REPLICA_MAX_LAG_SECONDS = float(os.getenv('DB_REPLICA_MAX_LAG_SECONDS', '5'))
+    DB_REPLICA_CHECK_SECONDS = 10
+    DB_REPLICA_CONNECT_TIMEOUT = 2
+    DB_READ_YOUR_WRITES_SECONDS = float(os.getenv('DB_READ_YOUR_WRITES_SECONDS', '10'))
+    DB_REPLICA_MAX_TRACKED_WRITERS = 10000
+
+    # Pool konekcija i prepared statementi
+    DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', '10'))
+    DB_POOL_MAX_AGE_SECONDS = int(os.getenv('DB_POOL_MAX_AGE_SECONDS', '1800'))
+    DB_POOL_VALIDATE_IDLE_SECONDS = 30
+    DB_PREPARED_MAX_STATEMENTS = 200
+
+    JWT_EXPIRATION_HOURS = 24
+
+    # Potpisivanje tokena - JWT_KEYS="kid:tajna,kid2:tajna2", novi tokeni se potpisuju
+    # ključem JWT_ACTIVE_KID, ostali vrijede samo za provjeru dok traje rotacija.
+    # Tokeni bez kid-a (stari) provjeravaju se ključem 'default' (SECRET_KEY).
+    JWT_ALGORITHM = os.getenv('JWT_ALGORITHM', 'HS256')
+    JWT_ALGORITHMS = [a.strip() for a in os.getenv('JWT_ALGORITHMS', JWT_ALGORITHM).split(',') if a.strip()]
+    JWT_KEYS = {
+        'default': SECRET_KEY,
+        **dict(item.strip().split(':', 1) for item in os.getenv('JWT_KEYS', '').split(',') if ':' in item)
+    }
+    JWT_ACTIVE_KID = os.getenv('JWT_ACTIVE_KID', 'default')
+
+    # Cache provjerenih tokena - sesija se ponovno provjerava nakon REVALIDATE sekundi
+    TOKEN_CACHE_SIZE = int(os.getenv('TOKEN_CACHE_SIZE', '10000'))
+    TOKEN_CACHE_REVALIDATE_SECONDS = int(os.getenv('TOKEN_CACHE_REVALIDATE_SECONDS', '30'))
+
+    # Pretraga
+    SEARCH_DEFAULT_LIMIT = int(os.getenv('SEARCH_DEFAULT_LIMIT', '10'))
+    SEARCH_MAX_LIMIT = int(os.getenv('SEARCH_MAX_LIMIT', '50'))
+    SEARCH_MIN_QUERY_LENGTH = 2
+    SEARCH_MIN_INFIX_LENGTH = 3
+
+    # Automatska dodjela mehaničara
+    SCHEDULER_HOURLY_RATE = float(os.getenv('SCHEDULER_HOURLY_RATE', '50'))
+    SCHEDULER_DEFAULT_ORDER_HOURS = float(os.getenv('SCHEDULER_DEFAULT_ORDER_HOURS', '2'))
+    SCHEDULER_MIN_ORDER_HOURS = 0.5
+    SCHEDULER_REFRESH_SECONDS = int(os.getenv('SCHEDULER_REFRESH_SECONDS', '300'))
+
+    # Server-Sent Events (LISTEN/NOTIFY)
+    EVENTS_CHANNEL = 'autoservis_events'
+    EVENTS_QUEUE_SIZE = int(os.getenv('EVENTS_QUEUE_SIZE', '100'))
+    EVENTS_KEEPALIVE_SECONDS = int(os.getenv('EVENTS_KEEPALIVE_SECONDS', '15'))
+    EVENTS_POLL_SECONDS = 5
+    EVENTS_RECONNECT_SECONDS = 5
+
+    # Audit log
+    AUDIT_DEFAULT_PAGE_SIZE = 100
+    AUDIT_MAX_PAGE_SIZE = int(os.getenv('AUDIT_MAX_PAGE_SIZE', '500'))
+
+    # Rate limiting (token bucket) i ograničenje istovremenih zahtjeva
+    RATE_LIMIT_BACKEND = os.getenv('RATE_LIMIT_BACKEND', 'memory')  # memory | postgres
+    RATE_LIMIT_MAX_KEYS = 10000
+    RATE_LIMITS = {
+        # capacity = najveći burst, refill_rate = tokena u sekundi, key = user | ip
+        'default': {'capacity': 60, 'refill_rate': 2.0, 'key': 'user'},
+        'login': {'capacity': 5, 'refill_rate': 5 / 60, 'key': 'ip'},
+        'heavy': {'capacity': 10, 'refill_rate': 0.5, 'key': 'user', 'concurrency': 4},
+        'search': {'capacity': 20, 'refill_rate': 2.0, 'key': 'user'},
+    }
+    MAX_CONCURRENT_REQUESTS = int(os.getenv('MAX_CONCURRENT_REQUESTS', '32'))
+    CONCURRENCY_WAIT_SECONDS = 0.5
+    CONCURRENCY_RETRY_AFTER = 1
+
+    # Kompresija odgovora
+    COMPRESSION_MIN_SIZE = int(os.getenv('COMPRESSION_MIN_SIZE', '1024'))
+    COMPRESSION_GZIP_LEVEL = 6
+    COMPRESSION_BROTLI_QUALITY = 5
+
+    # Arhiviranje završenih naloga
+    ARCHIVE_AFTER_DAYS = int(os.getenv('ARCHIVE_AFTER_DAYS', '365'))
+    ARCHIVE_BATCH_SIZE = int(os.getenv('ARCHIVE_BATCH_SIZE', '500'))
+    ARCHIVE_MAX_BATCHES = int(os.getenv('ARCHIVE_MAX_BATCHES', '20'))
+    ARCHIVE_DEFAULT_PAGE_SIZE = 50
+    ARCHIVE_MAX_PAGE_SIZE = 200
+
+    # Idempotency-Key za POST endpointe
+    IDEMPOTENCY_BACKEND = os.getenv('IDEMPOTENCY_BACKEND', 'memory')  # memory | postgres
+    IDEMPOTENCY_TTL_SECONDS = int(os.getenv('IDEMPOTENCY_TTL_SECONDS', '86400'))
+    IDEMPOTENCY_LOCK_SECONDS = 60
+    IDEMPOTENCY_MAX_KEYS = 10000
+    IDEMPOTENCY_MAX_KEY_LENGTH = 255
+
+    # Analitika prihoda - zatvoreni periodi se drže u cacheu, tekući se uvijek računa
+    ANALYTICS_DEFAULT_DAYS = 30
+    ANALYTICS_MAX_BUCKETS = 400
+    ANALYTICS_MAX_WINDOW = 90
+    ANALYTICS_CACHE_SIZE = int(os.getenv('ANALYTICS_CACHE_SIZE', '5000'))
+    ANALYTICS_CLOSED_BUCKET_TTL = int(os.getenv('ANALYTICS_CLOSED_BUCKET_TTL', '3600'))
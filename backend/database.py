@@ -1,8 +1,26 @@
+import hashlib
+import itertools
+import re
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
 import psycopg2
+import psycopg2.errors
+import psycopg2.extensions
 from psycopg2.extras import RealDictCursor
+from flask import has_request_context, request
 from config import Config
 
-def get_db_connection():
+class PreparedConnection(psycopg2.extensions.connection):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.prepared = set()
+        self.registry_generation = 0
+        self.created_at = time.monotonic()
+        self.idle_since = self.created_at
+
+def get_primary_connection(connection_factory=None):
     conn_params = {
         'host': Config.DB_HOST,
         'port': Config.DB_PORT,
@@ -13,29 +31,400 @@ def get_db_connection():
     }
     if Config.DB_PASSWORD:
         conn_params['password'] = Config.DB_PASSWORD
-    
+    if connection_factory:
+        conn_params['connection_factory'] = connection_factory
+
     conn = psycopg2.connect(**conn_params)
     conn.set_client_encoding('UTF8')
     return conn
 
-def execute_query(query, params=None, fetch=True):
-    conn = get_db_connection()
+# POOL
+
+class ConnectionPool:
+    def __init__(self, connect):
+        self._connect = connect
+        self._lock = threading.Lock()
+        self._idle = []
+
+    # Konekcija koja je dulje stajala provjerava se prije predaje -
+    # nakon restarta baze inače svaka stara konekcija završi jednim 500
+    def _alive(self, conn):
+        now = time.monotonic()
+        if conn.closed or now - conn.created_at >= Config.DB_POOL_MAX_AGE_SECONDS:
+            return False
+        if now - conn.idle_since < Config.DB_POOL_VALIDATE_IDLE_SECONDS:
+            return True
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def get(self):
+        while True:
+            with self._lock:
+                if not self._idle:
+                    break
+                conn = self._idle.pop()
+            if self._alive(conn):
+                return conn
+            conn.close()
+        return self._connect(PreparedConnection)
+
+    def put(self, conn, discard=False):
+        if conn.closed:
+            return
+        if not discard:
+            try:
+                conn.rollback()
+            except psycopg2.Error:
+                discard = True
+        with self._lock:
+            if not discard and len(self._idle) < Config.DB_POOL_SIZE:
+                conn.idle_since = time.monotonic()
+                self._idle.append(conn)
+                return
+        conn.close()
+
+    # Prekinuta konekcija obično znači restart baze - ostale u poolu su jednako mrtve
+    def clear(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.close()
+
+primary_pool = ConnectionPool(get_primary_connection)
+
+# READ REPLICAS
+
+class Replica:
+    def __init__(self, dsn):
+        self.dsn = dsn
+        self.healthy = True
+        self.lag = None
+        self.checked_at = 0
+        self.pool = ConnectionPool(self.connect)
+        self._check_lock = threading.Lock()
+
+    def connect(self, connection_factory=None):
+        conn = psycopg2.connect(
+            self.dsn,
+            cursor_factory=RealDictCursor,
+            connect_timeout=Config.DB_REPLICA_CONNECT_TIMEOUT,
+            connection_factory=connection_factory
+        )
+        conn.set_client_encoding('UTF8')
+        conn.set_session(readonly=True)
+        return conn
+
+    def check(self):
+        try:
+            conn = self.connect()
+            try:
+                with conn.cursor() as cursor:
+                    # Bez novih transakcija na primaryju replay_timestamp stari,
+                    # pa se lag računa samo dok replika nije sustigla primljeni WAL
+                    cursor.execute("""
+                        SELECT CASE
+                                   WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+                                   ELSE COALESCE(EXTRACT(EPOCH FROM (now() - pg_last_xact_replay_timestamp())), 0)
+                               END as lag
+                    """)
+                    self.lag = float(cursor.fetchone()['lag'])
+            finally:
+                conn.close()
+            self.healthy = self.lag <= Config.DB_REPLICA_MAX_LAG_SECONDS
+        except psycopg2.Error:
+            self.lag = None
+            self.healthy = False
+        self.checked_at = time.monotonic()
+
+    # Samo jedan zahtjev provjerava repliku, ostali za to vrijeme koriste zadnje stanje
+    def check_if_due(self):
+        if time.monotonic() - self.checked_at <= Config.DB_REPLICA_CHECK_SECONDS:
+            return
+        if not self._check_lock.acquire(blocking=False):
+            return
+        try:
+            if time.monotonic() - self.checked_at > Config.DB_REPLICA_CHECK_SECONDS:
+                self.checked_at = time.monotonic()
+                self.check()
+        finally:
+            self._check_lock.release()
+
+    def mark_failed(self):
+        self.healthy = False
+        self.checked_at = time.monotonic()
+
+
+class ReplicaRouter:
+    def __init__(self, dsns):
+        self.replicas = [Replica(dsn) for dsn in dsns]
+        self._cycle = itertools.cycle(self.replicas) if self.replicas else None
+        self._lock = threading.Lock()
+        self._recent_writers = {}
+
+    def next_healthy(self):
+        for _ in range(len(self.replicas)):
+            with self._lock:
+                replica = next(self._cycle)
+            replica.check_if_due()
+            if replica.healthy:
+                return replica
+        return None
+
+    def _client_key(self):
+        return getattr(request, 'user_id', None) or request.remote_addr
+
+    def mark_write(self):
+        with self._lock:
+            now = time.monotonic()
+            self._recent_writers[self._client_key()] = now
+            if len(self._recent_writers) > Config.DB_REPLICA_MAX_TRACKED_WRITERS:
+                cutoff = now - Config.DB_READ_YOUR_WRITES_SECONDS
+                self._recent_writers = {k: t for k, t in self._recent_writers.items() if t > cutoff}
+
+    def _wrote_recently(self):
+        with self._lock:
+            written_at = self._recent_writers.get(self._client_key())
+        return written_at is not None and time.monotonic() - written_at < Config.DB_READ_YOUR_WRITES_SECONDS
+
+    def use_replica(self):
+        if not self.replicas or not has_request_context():
+            return False
+        if request.method not in ('GET', 'HEAD'):
+            return False
+        if request.headers.get('X-Read-Primary'):
+            return False
+        return not self._wrote_recently()
+
+    def connect(self):
+        replica = self.next_healthy()
+        if replica is None:
+            return None
+        try:
+            return replica.connect()
+        except psycopg2.Error:
+            replica.mark_failed()
+            return None
+
+    def status(self):
+        return [
+            {'healthy': r.healthy, 'lag_seconds': r.lag}
+            for r in self.replicas
+        ]
+
+
+router = ReplicaRouter(Config.DB_REPLICA_DSNS)
+
+def route_write():
+    if has_request_context() and request.method not in ('GET', 'HEAD'):
+        # Nakon pisanja klijent čita s primaryja dok replike ne sustignu
+        router.mark_write()
+
+def get_db_connection(readonly=False):
+    if readonly and router.use_replica():
+        conn = router.connect()
+        if conn is not None:
+            return conn
+    else:
+        route_write()
+    return get_primary_connection()
+
+@contextmanager
+def pooled_connection(readonly=False):
+    pool = None
+    conn = None
+    if readonly and router.use_replica():
+        replica = router.next_healthy()
+        if replica is not None:
+            try:
+                conn = replica.pool.get()
+                pool = replica.pool
+            except psycopg2.Error:
+                replica.mark_failed()
+    else:
+        route_write()
+
+    if conn is None:
+        pool = primary_pool
+        conn = pool.get()
+
     try:
+        yield conn
+    except (psycopg2.OperationalError, psycopg2.InterfaceError):
+        if conn.closed:
+            pool.clear()
+        pool.put(conn, discard=True)
+        raise
+    except Exception:
+        pool.put(conn)
+        raise
+    else:
+        pool.put(conn)
+
+# PREPARED STATEMENTS
+
+PARAM_PATTERN = re.compile(r'%%|%s|%\((\w+)\)s')
+
+class PreparedStatement:
+    def __init__(self, query):
+        self.names = []
+        self.positional = 0
+        self.sql = PARAM_PATTERN.sub(self._placeholder, query)
+        self.name = 'ps_' + hashlib.sha1(query.encode()).hexdigest()[:16]
+        count = max(len(self.names), self.positional)
+        self.execute_sql = f"EXECUTE {self.name}"
+        if count:
+            self.execute_sql += f"({', '.join(['%s'] * count)})"
+
+    def _placeholder(self, match):
+        if match.group(0) == '%%':
+            return '%'
+        if match.group(1) is None:
+            self.positional += 1
+            return f'${self.positional}'
+        if match.group(1) not in self.names:
+            self.names.append(match.group(1))
+        return f'${self.names.index(match.group(1)) + 1}'
+
+    def bind(self, params):
+        if self.names:
+            return [params[name] for name in self.names]
+        return list(params or ())
+
+
+class PreparedStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.prepares = 0
+        self.executions = 0
+        self.reused = 0
+        self.prepare_seconds = 0.0
+        self.reprepared = 0
+
+    def record(self, prepare_seconds=None, reprepared=False):
+        with self._lock:
+            self.executions += 1
+            if prepare_seconds is None:
+                self.reused += 1
+            else:
+                self.prepares += 1
+                self.prepare_seconds += prepare_seconds
+            if reprepared:
+                self.reprepared += 1
+
+    def snapshot(self):
+        with self._lock:
+            avg_prepare = self.prepare_seconds / self.prepares if self.prepares else 0.0
+            return {
+                'statements_prepared': self.prepares,
+                'executions': self.executions,
+                'reused': self.reused,
+                'reprepared_after_reset': self.reprepared,
+                'avg_prepare_ms': round(avg_prepare * 1000, 3),
+                # Procjena: svako ponovno korištenje štedi parse/analyze koliko traje PREPARE
+                'estimated_saved_ms': round(self.reused * avg_prepare * 1000, 3)
+            }
+
+
+# LRU registar - izbačene naredbe svaka konekcija dealocira pri idućem korištenju
+statements = OrderedDict()
+statements_lock = threading.Lock()
+registry_generation = 0
+prepared_stats = PreparedStats()
+
+def get_statement(query):
+    global registry_generation
+    with statements_lock:
+        statement = statements.get(query)
+        if statement is None:
+            statement = statements[query] = PreparedStatement(query)
+            while len(statements) > Config.DB_PREPARED_MAX_STATEMENTS:
+                statements.popitem(last=False)
+                registry_generation += 1
+        else:
+            statements.move_to_end(query)
+        return statement
+
+def deallocate_evicted(cursor):
+    conn = cursor.connection
+    with statements_lock:
+        generation = registry_generation
+        if conn.registry_generation == generation:
+            return
+        live = {statement.name for statement in statements.values()}
+    for name in conn.prepared - live:
+        cursor.execute(f"DEALLOCATE {name}")
+        conn.prepared.discard(name)
+    conn.registry_generation = generation
+
+def execute_prepared(cursor, statement, params):
+    conn = cursor.connection
+    args = statement.bind(params)
+    deallocate_evicted(cursor)
+
+    for attempt in range(2):
+        prepare_seconds = None
+        if statement.name not in conn.prepared:
+            started = time.perf_counter()
+            cursor.execute(f"PREPARE {statement.name} AS {statement.sql}")
+            prepare_seconds = time.perf_counter() - started
+            conn.prepared.add(statement.name)
+        try:
+            cursor.execute(statement.execute_sql, args)
+        except psycopg2.errors.InvalidSqlStatementName:
+            # Server je odbacio naredbe (npr. DISCARD ALL u pooleru) - pripremi ponovno
+            conn.rollback()
+            conn.prepared.clear()
+            if attempt:
+                raise
+            continue
+        prepared_stats.record(prepare_seconds, reprepared=attempt > 0)
+        return
+
+def run(cursor, query, params, prepare):
+    statement = None
+    if prepare and isinstance(cursor.connection, PreparedConnection):
+        statement = get_statement(query)
+
+    if statement:
+        execute_prepared(cursor, statement, params)
+    else:
+        cursor.execute(query, params)
+
+# Čitanje koje padne na prekinutoj konekciji ponavlja se jednom na novoj -
+# pisanje se ne ponavlja jer nije poznato je li commit prošao
+def read_with_retry(read):
+    try:
+        return read()
+    except psycopg2.errors.QueryCanceled:
+        raise
+    except (psycopg2.OperationalError, psycopg2.InterfaceError):
+        return read()
+
+def execute_query(query, params=None, fetch=True, prepare=False):
+    if fetch:
+        return read_with_retry(lambda: fetch_all(query, params, prepare))
+    with pooled_connection() as conn:
         with conn.cursor() as cursor:
-            cursor.execute(query, params or ())
-            if fetch:
-                result = cursor.fetchall()
-                return result
+            run(cursor, query, params or (), prepare)
             conn.commit()
             return None
-    finally:
-        conn.close()
 
-def execute_one(query, params=None):
-    conn = get_db_connection()
-    try:
+def fetch_all(query, params, prepare):
+    with pooled_connection(readonly=True) as conn:
         with conn.cursor() as cursor:
-            cursor.execute(query, params)
+            run(cursor, query, params or (), prepare)
+            return cursor.fetchall()
+
+def fetch_one(query, params, prepare):
+    with pooled_connection(readonly=True) as conn:
+        with conn.cursor() as cursor:
+            run(cursor, query, params, prepare)
             return cursor.fetchone()
-    finally:
-        conn.close()
\ No newline at end of file
+
+def execute_one(query, params=None, prepare=False):
+    return read_with_retry(lambda: fetch_one(query, params, prepare))
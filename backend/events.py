@@ -0,0 +1,135 @@
+import json
+import queue
+import select
+import threading
+import time
+import psycopg2
+from config import Config
+from database import get_db_connection
+
+RESYNC_EVENT = {'table': 'resync'}
+
+
+def visibility_filter(user_id, user_roles):
+    user_id = str(user_id)
+
+    if 'owner' in user_roles:
+        return lambda event: True
+
+    sees_all_orders = any(role in user_roles for role in ['receptionist', 'head_mechanic'])
+    sees_all_invoices = any(role in user_roles for role in ['receptionist', 'accountant'])
+    is_mechanic = 'mechanic' in user_roles
+    is_customer = 'customer' in user_roles
+
+    def visible(event):
+        if event['table'] == 'invoices':
+            if sees_all_invoices:
+                return True
+        elif sees_all_orders:
+            return True
+        elif is_mechanic and event.get('mechanic_id') == user_id:
+            return True
+        return is_customer and event.get('customer_id') == user_id
+
+    return visible
+
+
+class Subscription:
+    def __init__(self, visible):
+        self.visible = visible
+        self.queue = queue.Queue(maxsize=Config.EVENTS_QUEUE_SIZE)
+
+    def put(self, event):
+        try:
+            self.queue.put_nowait(event)
+        except queue.Full:
+            # Klijent ne stiže čitati - odbaci red i traži ponovno učitavanje
+            with self.queue.mutex:
+                self.queue.queue.clear()
+            self.queue.put_nowait(RESYNC_EVENT)
+
+
+# Jedna zajednička LISTEN konekcija po procesu, pokreće se s prvim pretplatnikom
+# i gasi kad ih više nema.
+class EventBroker:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = set()
+        self._thread = None
+
+    def subscribe(self, visible):
+        subscription = Subscription(visible)
+        with self._lock:
+            self._subscribers.add(subscription)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._listen, name='event-listener', daemon=True)
+                self._thread.start()
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    def _should_stop(self):
+        with self._lock:
+            if not self._subscribers:
+                self._thread = None
+                return True
+            return False
+
+    def _publish(self, payload):
+        try:
+            event = json.loads(payload)
+        except ValueError:
+            return
+
+        with self._lock:
+            subscribers = list(self._subscribers)
+
+        for subscription in subscribers:
+            if subscription.visible(event):
+                subscription.put(event)
+
+    def _listen(self):
+        while not self._should_stop():
+            conn = None
+            try:
+                conn = get_db_connection()
+                conn.autocommit = True
+                with conn.cursor() as cursor:
+                    cursor.execute(f"LISTEN {Config.EVENTS_CHANNEL}")
+
+                while True:
+                    if select.select([conn], [], [], Config.EVENTS_POLL_SECONDS) == ([], [], []):
+                        if self._should_stop():
+                            return
+                        continue
+                    conn.poll()
+                    while conn.notifies:
+                        self._publish(conn.notifies.pop(0).payload)
+            except (psycopg2.Error, OSError):
+                # Obavijesti poslane dok veza nije radila su izgubljene
+                with self._lock:
+                    subscribers = list(self._subscribers)
+                for subscription in subscribers:
+                    subscription.put(RESYNC_EVENT)
+                time.sleep(Config.EVENTS_RECONNECT_SECONDS)
+            finally:
+                if conn is not None:
+                    conn.close()
+
+    def stream(self, subscription):
+        try:
+            yield f"retry: {Config.EVENTS_RECONNECT_SECONDS * 1000}\n\n"
+            while True:
+                try:
+                    event = subscription.queue.get(timeout=Config.EVENTS_KEEPALIVE_SECONDS)
+                except queue.Empty:
+                    yield ": keepalive\n\n"
+                    continue
+                yield f"event: {event['table']}\ndata: {json.dumps(event)}\n\n"
+        finally:
+            self.unsubscribe(subscription)
+
+
+broker = EventBroker()
@@ -0,0 +1,215 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from flask import Response, jsonify, make_response, request
+import psycopg2
+from config import Config
+from database import get_db_connection
+
+
+class MemoryStore:
+    def __init__(self, max_keys):
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._max_keys = max_keys
+
+    def _live(self, key, now):
+        entry = self._entries.get(key)
+        if entry and entry['expires_at'] <= now:
+            del self._entries[key]
+            return None
+        return entry
+
+    def lookup(self, key):
+        with self._lock:
+            entry = self._live(key, time.monotonic())
+        return entry if entry and entry['status'] is not None else None
+
+    def claim(self, key, fingerprint):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._live(key, now)
+            if entry:
+                return entry
+
+            self._entries[key] = {
+                'fingerprint': fingerprint,
+                'status': None,
+                'expires_at': now + Config.IDEMPOTENCY_LOCK_SECONDS
+            }
+            while len(self._entries) > self._max_keys:
+                self._entries.popitem(last=False)
+        return None
+
+    def complete(self, key, fingerprint, status, body, content_type):
+        with self._lock:
+            self._entries[key] = {
+                'fingerprint': fingerprint,
+                'status': status,
+                'body': body,
+                'content_type': content_type,
+                'expires_at': time.monotonic() + Config.IDEMPOTENCY_TTL_SECONDS
+            }
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._max_keys:
+                self._entries.popitem(last=False)
+
+    def release(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry['status'] is None:
+                del self._entries[key]
+
+
+# Zajedničko stanje za više workera - tablica idempotency_keys,
+# završeni odgovori se drže i lokalno pa ponovljeni zahtjev ne ide u bazu
+class PostgresStore:
+    def __init__(self, local):
+        self._local = local
+
+    def claim(self, key, fingerprint):
+        cached = self._local.lookup(key)
+        if cached:
+            return cached
+
+        try:
+            conn = get_db_connection()
+            try:
+                with conn.cursor() as cursor:
+                    # Novi ključ ili istekli zapis - ovaj zahtjev preuzima obradu
+                    cursor.execute("""
+                        INSERT INTO idempotency_keys (idempotency_key, fingerprint, expires_at)
+                        VALUES (%s, %s, CURRENT_TIMESTAMP + %s * INTERVAL '1 second')
+                        ON CONFLICT (idempotency_key) DO UPDATE
+                        SET fingerprint = EXCLUDED.fingerprint,
+                            status_code = NULL,
+                            response_body = NULL,
+                            content_type = NULL,
+                            created_at = CURRENT_TIMESTAMP,
+                            expires_at = EXCLUDED.expires_at
+                        WHERE idempotency_keys.expires_at < CURRENT_TIMESTAMP
+                        RETURNING idempotency_key
+                    """, (key, fingerprint, Config.IDEMPOTENCY_LOCK_SECONDS))
+                    claimed = cursor.fetchone() is not None
+
+                    row = None
+                    if not claimed:
+                        cursor.execute("""
+                            SELECT fingerprint, status_code, response_body, content_type
+                            FROM idempotency_keys
+                            WHERE idempotency_key = %s
+                        """, (key,))
+                        row = cursor.fetchone()
+                    conn.commit()
+            finally:
+                conn.close()
+        except psycopg2.Error:
+            return self._local.claim(key, fingerprint)
+
+        if claimed:
+            return None
+        if row is None:
+            # Zapis je obrisan između INSERT-a i SELECT-a - prvi zahtjev još nije gotov
+            return {'fingerprint': fingerprint, 'status': None}
+        return {
+            'fingerprint': row['fingerprint'],
+            'status': row['status_code'],
+            'body': row['response_body'],
+            'content_type': row['content_type']
+        }
+
+    def complete(self, key, fingerprint, status, body, content_type):
+        self._local.complete(key, fingerprint, status, body, content_type)
+        try:
+            conn = get_db_connection()
+            try:
+                with conn.cursor() as cursor:
+                    cursor.execute("""
+                        UPDATE idempotency_keys
+                        SET status_code = %s,
+                            response_body = %s,
+                            content_type = %s,
+                            expires_at = CURRENT_TIMESTAMP + %s * INTERVAL '1 second'
+                        WHERE idempotency_key = %s
+                    """, (status, body, content_type, Config.IDEMPOTENCY_TTL_SECONDS, key))
+                    conn.commit()
+            finally:
+                conn.close()
+        except psycopg2.Error:
+            pass
+
+    def release(self, key):
+        self._local.release(key)
+        try:
+            conn = get_db_connection()
+            try:
+                with conn.cursor() as cursor:
+                    cursor.execute(
+                        "DELETE FROM idempotency_keys WHERE idempotency_key = %s AND status_code IS NULL",
+                        (key,)
+                    )
+                    conn.commit()
+            finally:
+                conn.close()
+        except psycopg2.Error:
+            pass
+
+
+memory = MemoryStore(Config.IDEMPOTENCY_MAX_KEYS)
+store = PostgresStore(memory) if Config.IDEMPOTENCY_BACKEND == 'postgres' else memory
+
+def request_fingerprint():
+    digest = hashlib.sha256()
+    digest.update(request.method.encode())
+    digest.update(b'\n')
+    digest.update(request.path.encode())
+    digest.update(b'\n')
+    digest.update(request.get_data())
+    return digest.hexdigest()
+
+# Ide ispod @require_auth - ključ je vezan uz korisnika
+def idempotent(f):
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        key = request.headers.get('Idempotency-Key')
+        if not key:
+            return f(*args, **kwargs)
+        if len(key) > Config.IDEMPOTENCY_MAX_KEY_LENGTH:
+            return jsonify({'error': 'Idempotency-Key je predugačak'}), 400
+
+        scoped_key = f"{getattr(request, 'user_id', None) or request.remote_addr}:{key}"
+        fingerprint = request_fingerprint()
+
+        entry = store.claim(scoped_key, fingerprint)
+        if entry is not None:
+            if entry['fingerprint'] != fingerprint:
+                return jsonify({'error': 'Idempotency-Key je već korišten za drugi zahtjev'}), 422
+            if entry['status'] is None:
+                response = jsonify({'error': 'Zahtjev s ovim Idempotency-Key se još obrađuje'})
+                response.status_code = 409
+                response.headers['Retry-After'] = '1'
+                return response
+
+            response = Response(entry['body'], status=entry['status'], content_type=entry['content_type'])
+            response.headers['Idempotent-Replayed'] = 'true'
+            return response
+
+        try:
+            response = make_response(f(*args, **kwargs))
+        except Exception:
+            store.release(scoped_key)
+            raise
+
+        # Pamte se samo uspješni odgovori - neuspjeli zahtjev nije ništa upisao pa ga se smije ponoviti
+        if 200 <= response.status_code < 300:
+            store.complete(
+                scoped_key, fingerprint, response.status_code,
+                response.get_data(as_text=True), response.content_type
+            )
+        else:
+            store.release(scoped_key)
+        return response
+
+    return decorated
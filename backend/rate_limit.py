@@ -0,0 +1,140 @@
+import math
+import threading
+import time
+from collections import OrderedDict
+from flask import current_app, g, jsonify, request
+import psycopg2
+from config import Config
+from auth_helper import decode_token
+from database import primary_pool
+
+
+class MemoryBackend:
+    def __init__(self, max_keys):
+        self._lock = threading.Lock()
+        self._buckets = OrderedDict()
+        self._max_keys = max_keys
+
+    def take(self, key, capacity, refill_rate):
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.pop(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - updated) * refill_rate)
+
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+
+            self._buckets[key] = (tokens, now)
+            if len(self._buckets) > self._max_keys:
+                self._buckets.popitem(last=False)
+
+        return allowed, 0 if allowed else (1 - tokens) / refill_rate
+
+
+# Zajedničko stanje za više workera - UNLOGGED tablica rate_limit_buckets
+class PostgresBackend:
+    def __init__(self, fallback):
+        self._fallback = fallback
+
+    def take(self, key, capacity, refill_rate):
+        # Konekcija iz poola, ne nova - inače bi svaki zahtjev otvarao konekciju na bazu
+        conn = None
+        try:
+            conn = primary_pool.get()
+            with conn.cursor() as cursor:
+                cursor.execute(
+                    "SELECT allowed, retry_after FROM rate_limit_take(%s, %s, %s)",
+                    (key, capacity, refill_rate)
+                )
+                result = cursor.fetchone()
+                conn.commit()
+            primary_pool.put(conn)
+            return result['allowed'], result['retry_after']
+        except psycopg2.Error:
+            if conn is not None:
+                primary_pool.put(conn, discard=True)
+            return self._fallback.take(key, capacity, refill_rate)
+
+
+class RateLimiter:
+    def __init__(self):
+        memory = MemoryBackend(Config.RATE_LIMIT_MAX_KEYS)
+        if Config.RATE_LIMIT_BACKEND == 'postgres':
+            self.backend = PostgresBackend(memory)
+        else:
+            self.backend = memory
+
+        self._global = threading.BoundedSemaphore(Config.MAX_CONCURRENT_REQUESTS)
+        self._per_class = {
+            name: threading.BoundedSemaphore(rule['concurrency'])
+            for name, rule in Config.RATE_LIMITS.items()
+            if rule and rule.get('concurrency')
+        }
+
+    def init_app(self, app):
+        app.before_request(self._before_request)
+        app.teardown_request(self._teardown_request)
+
+    def limit(self, rule_name):
+        def decorator(f):
+            f.rate_limit_rule = rule_name
+            return f
+        return decorator
+
+    def exempt(self, f):
+        f.rate_limit_rule = None
+        return f
+
+    def _client_key(self, key_type):
+        if key_type == 'user':
+            token = request.headers.get('Authorization', '')
+            if token.startswith('Bearer '):
+                token = token[7:]
+            payload = decode_token(token) if token else None
+            if payload:
+                return f"user:{payload['user_id']}"
+        return f"ip:{request.remote_addr}"
+
+    def _reject(self, status, retry_after, message):
+        response = jsonify({'error': message})
+        response.status_code = status
+        response.headers['Retry-After'] = str(max(1, math.ceil(retry_after)))
+        return response
+
+    def _before_request(self):
+        if request.method == 'OPTIONS' or not request.endpoint:
+            return None
+
+        view = current_app.view_functions.get(request.endpoint)
+        rule_name = getattr(view, 'rate_limit_rule', 'default')
+        rule = Config.RATE_LIMITS.get(rule_name)
+        if not rule:
+            return None
+
+        # Prvo admission control - ni provjera limita (postgres backend) ne smije
+        # trošiti konekcije na bazu kad je poslužitelj već preopterećen
+        held = []
+        for semaphore in (self._global, self._per_class.get(rule_name)):
+            if semaphore is None:
+                continue
+            if not semaphore.acquire(timeout=Config.CONCURRENCY_WAIT_SECONDS):
+                for s in held:
+                    s.release()
+                return self._reject(503, Config.CONCURRENCY_RETRY_AFTER, 'Poslužitelj je preopterećen')
+            held.append(semaphore)
+        g.rate_limit_held = held
+
+        key = f"{rule_name}:{self._client_key(rule['key'])}"
+        allowed, retry_after = self.backend.take(key, rule['capacity'], rule['refill_rate'])
+        if not allowed:
+            # teardown_request oslobađa semafore i za odbijene zahtjeve
+            return self._reject(429, retry_after, 'Previše zahtjeva, pokušajte kasnije')
+        return None
+
+    def _teardown_request(self, exc):
+        for semaphore in g.pop('rate_limit_held', []):
+            semaphore.release()
+
+
+limiter = RateLimiter()
@@ -0,0 +1,221 @@
+import heapq
+import threading
+import time
+import psycopg2
+from psycopg2.extras import execute_values
+from config import Config
+from database import execute_query, execute_one, get_db_connection
+
+OPEN_STATUSES = ('pending', 'approved', 'in_progress', 'waiting_parts', 'on_hold')
+
+
+class AssignmentConflict(Exception):
+    pass
+
+
+def estimate_hours(estimated_cost, hours_logged=0):
+    # Ista satnica kao u calculate_work_order_cost
+    if estimated_cost is None:
+        hours = Config.SCHEDULER_DEFAULT_ORDER_HOURS
+    else:
+        hours = float(estimated_cost) / Config.SCHEDULER_HOURLY_RATE
+    return max(hours - float(hours_logged or 0), Config.SCHEDULER_MIN_ORDER_HOURS)
+
+
+# Opterećenje mehaničara u memoriji - min-heap po procijenjenim satima.
+# Heap se ažurira inkrementalno (zastarjeli zapisi se preskaču preko verzija),
+# a cijelo stanje se periodički ponovno učitava iz baze.
+class MechanicScheduler:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._loaded_at = None
+        self._mechanics = {}
+        self._orders = {}
+        self._versions = {}
+        self._heap = []
+
+    def invalidate(self):
+        with self._lock:
+            self._loaded_at = None
+
+    def _ensure_loaded(self):
+        if self._loaded_at and time.monotonic() - self._loaded_at < Config.SCHEDULER_REFRESH_SECONDS:
+            return
+
+        mechanics = execute_query("""
+            SELECT DISTINCT u.user_id, u.username
+            FROM users u
+            JOIN user_roles ur ON u.user_id = ur.user_id
+            JOIN roles r ON ur.role_id = r.role_id
+            WHERE r.role_name IN ('mechanic', 'head_mechanic')
+              AND u.status = 'active'
+        """)
+        orders = execute_query("""
+            SELECT wo.work_order_id, wo.assigned_mechanic_id, wo.estimated_cost,
+                   COALESCE(SUM(wl.hours_worked), 0) as hours_logged
+            FROM work_orders wo
+            LEFT JOIN work_log wl ON wo.work_order_id = wl.work_order_id
+            WHERE wo.status = ANY(%s::work_order_status[])
+              AND wo.assigned_mechanic_id IS NOT NULL
+            GROUP BY wo.work_order_id
+        """, (list(OPEN_STATUSES),))
+
+        self._mechanics = {
+            str(m['user_id']): {'username': m['username'], 'open_orders': 0, 'estimated_hours': 0.0}
+            for m in mechanics
+        }
+        self._orders = {}
+        for order in orders:
+            mechanic_id = str(order['assigned_mechanic_id'])
+            hours = estimate_hours(order['estimated_cost'], order['hours_logged'])
+            self._orders[str(order['work_order_id'])] = (mechanic_id, hours)
+            if mechanic_id in self._mechanics:
+                self._mechanics[mechanic_id]['open_orders'] += 1
+                self._mechanics[mechanic_id]['estimated_hours'] += hours
+
+        self._versions = {mechanic_id: 0 for mechanic_id in self._mechanics}
+        self._heap = [
+            (m['estimated_hours'], m['open_orders'], mechanic_id, 0)
+            for mechanic_id, m in self._mechanics.items()
+        ]
+        heapq.heapify(self._heap)
+        self._loaded_at = time.monotonic()
+
+    def _push(self, mechanic_id):
+        m = self._mechanics[mechanic_id]
+        self._versions[mechanic_id] += 1
+        heapq.heappush(self._heap, (m['estimated_hours'], m['open_orders'], mechanic_id, self._versions[mechanic_id]))
+
+    def _adjust(self, mechanic_id, orders_delta, hours_delta):
+        if mechanic_id not in self._mechanics:
+            return
+        m = self._mechanics[mechanic_id]
+        m['open_orders'] += orders_delta
+        m['estimated_hours'] = max(m['estimated_hours'] + hours_delta, 0.0)
+        self._push(mechanic_id)
+
+    def _set_order(self, order_id, mechanic_id, hours):
+        previous = self._orders.pop(order_id, None)
+        if previous:
+            self._adjust(previous[0], -1, -previous[1])
+        if mechanic_id:
+            self._orders[order_id] = (mechanic_id, hours)
+            self._adjust(mechanic_id, 1, hours)
+
+    def _least_loaded(self):
+        while self._heap:
+            hours, count, mechanic_id, version = self._heap[0]
+            if self._versions.get(mechanic_id) == version:
+                return mechanic_id
+            heapq.heappop(self._heap)
+        return None
+
+    # Zove se nakon već potvrđenog pisanja pa ne smije baciti grešku -
+    # ako upit ne uspije, stanje se ponovno učita pri sljedećem korištenju
+    def order_changed(self, order_id):
+        if not self._loaded_at:
+            return
+
+        order_id = str(order_id)
+        try:
+            row = execute_one("""
+                SELECT wo.assigned_mechanic_id, wo.status, wo.estimated_cost,
+                       COALESCE((SELECT SUM(hours_worked) FROM work_log WHERE work_order_id = wo.work_order_id), 0)
+                           as hours_logged
+                FROM work_orders wo
+                WHERE wo.work_order_id = %s
+            """, (order_id,))
+        except psycopg2.Error:
+            self.invalidate()
+            return
+
+        with self._lock:
+            if not self._loaded_at:
+                return
+            if not row or row['status'] not in OPEN_STATUSES or not row['assigned_mechanic_id']:
+                self._set_order(order_id, None, 0)
+            else:
+                self._set_order(order_id, str(row['assigned_mechanic_id']),
+                                estimate_hours(row['estimated_cost'], row['hours_logged']))
+
+    def workload(self):
+        with self._lock:
+            self._ensure_loaded()
+            result = [
+                {
+                    'mechanic_id': mechanic_id,
+                    'username': m['username'],
+                    'open_orders': m['open_orders'],
+                    'estimated_hours': round(m['estimated_hours'], 2)
+                }
+                for mechanic_id, m in self._mechanics.items()
+            ]
+        return sorted(result, key=lambda m: (m['estimated_hours'], m['open_orders']))
+
+    def _plan(self, orders):
+        # Najveći nalozi prvi (LPT), svaki ide najmanje opterećenom mehaničaru
+        plan = []
+        for order in sorted(orders, key=lambda o: o['hours'], reverse=True):
+            mechanic_id = self._least_loaded()
+            if mechanic_id is None:
+                break
+            self._set_order(order['work_order_id'], mechanic_id, order['hours'])
+            plan.append((order['work_order_id'], mechanic_id))
+        return plan
+
+    # Vraća samo stvarno upisane dodjele
+    def _apply(self, plan):
+        if not plan:
+            return []
+        conn = get_db_connection()
+        try:
+            with conn.cursor() as cursor:
+                rows = execute_values(cursor, """
+                    UPDATE work_orders wo
+                    SET assigned_mechanic_id = plan.mechanic_id::uuid
+                    FROM (VALUES %s) AS plan (work_order_id, mechanic_id)
+                    WHERE wo.work_order_id = plan.work_order_id::uuid
+                      AND wo.assigned_mechanic_id IS NULL
+                    RETURNING wo.work_order_id
+                """, plan, page_size=len(plan), fetch=True)
+                conn.commit()
+            applied = {str(row['work_order_id']) for row in rows}
+            # Netko je u međuvremenu ručno dodijelio nalog
+            if len(applied) != len(plan):
+                self.invalidate()
+            return [(order_id, mechanic_id) for order_id, mechanic_id in plan if order_id in applied]
+        except Exception:
+            self.invalidate()
+            raise
+        finally:
+            conn.close()
+
+    def auto_assign(self, order):
+        with self._lock:
+            self._ensure_loaded()
+            plan = self._plan([{
+                'work_order_id': str(order['work_order_id']),
+                'hours': estimate_hours(order['estimated_cost'])
+            }])
+        if not plan:
+            return None
+        if not self._apply(plan):
+            raise AssignmentConflict('Radni nalog je u međuvremenu dodijeljen')
+        return plan[0][1]
+
+    def auto_assign_pending(self):
+        pending = execute_query("""
+            SELECT work_order_id, estimated_cost
+            FROM pending_work_orders
+            WHERE assigned_mechanic IS NULL
+        """)
+        with self._lock:
+            self._ensure_loaded()
+            plan = self._plan([
+                {'work_order_id': str(o['work_order_id']), 'hours': estimate_hours(o['estimated_cost'])}
+                for o in pending
+            ])
+        return self._apply(plan)
+
+
+scheduler = MechanicScheduler()
@@ -0,0 +1,85 @@
+#!/bin/bash
+# Usporedba uuid_generate_v4() i uuid_generate_v7() kao primarnih ključeva:
+# pojedinačni INSERT-i preko pgbencha (kao što ih aplikacija radi), WAL koji
+# su proizveli, veličina B-tree indeksa i gustoća listova.
+#
+#   database/benchmarks/uuid_primary_keys.sh [baza] [broj_unosa] [klijenti]
+#
+# Pokrenuti na bazi nakon schema.sql (treba uuid_generate_v7). Tablice su obične
+# (logirane, inače nema WAL-a) u shemi bench_uuid koja se briše na kraju.
+# Sav promet na bazi za vrijeme mjerenja ulazi u WAL - pokretati na mirnoj bazi.
+set -e
+
+DB=${1:-autoservis}
+ROWS=${2:-200000}
+CLIENTS=${3:-8}
+SCHEMA=bench_uuid
+PER_CLIENT=$((ROWS / CLIENTS))
+TOTAL=$((PER_CLIENT * CLIENTS))
+
+psql_q() {
+    psql -X -q -v ON_ERROR_STOP=1 -d "$DB" "$@"
+}
+
+WORKDIR=$(mktemp -d)
+cleanup() {
+    psql_q -c "DROP SCHEMA IF EXISTS $SCHEMA CASCADE" > /dev/null
+    rm -rf "$WORKDIR"
+}
+trap cleanup EXIT
+
+psql_q <<EOF
+DROP SCHEMA IF EXISTS $SCHEMA CASCADE;
+CREATE SCHEMA $SCHEMA;
+
+CREATE TABLE $SCHEMA.v4 (
+    id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    payload TEXT
+);
+
+CREATE TABLE $SCHEMA.v7 (
+    id UUID PRIMARY KEY DEFAULT uuid_generate_v7(),
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    payload TEXT
+);
+EOF
+
+for pk in v4 v7; do
+    echo "INSERT INTO $SCHEMA.$pk (payload) VALUES (md5(random()::text));" > "$WORKDIR/$pk.sql"
+
+    # Nakon checkpointa obje varijante kreću s istim full-page writeovima
+    if ! psql_q -c "CHECKPOINT" > /dev/null 2>&1; then
+        echo "CHECKPOINT nije dozvoljen - WAL uključuje i full-page writeove ranijeg prometa"
+    fi
+    start_lsn=$(psql_q -At -c "SELECT pg_current_wal_lsn()")
+
+    echo "== $pk: $TOTAL pojedinačnih INSERT-a, $CLIENTS klijenata"
+    pgbench -n -M prepared -c "$CLIENTS" -j "$CLIENTS" -t "$PER_CLIENT" -f "$WORKDIR/$pk.sql" "$DB" \
+        | grep -E "latency average|tps"
+
+    psql_q -At -c "SELECT pg_wal_lsn_diff(pg_current_wal_lsn(), '$start_lsn')" > "$WORKDIR/$pk.wal"
+done
+
+psql_q <<EOF
+SELECT
+    b.pk,
+    pg_size_pretty(b.wal_bytes) as wal,
+    round(b.wal_bytes / $TOTAL) as wal_bytes_per_row,
+    pg_size_pretty(pg_relation_size(format('%I.%I', '$SCHEMA', b.pk || '_pkey')::regclass)) as index_size,
+    pg_relation_size(format('%I.%I', '$SCHEMA', b.pk || '_pkey')::regclass)
+        / current_setting('block_size')::int as index_pages
+FROM (VALUES
+    ('v4', $(cat "$WORKDIR/v4.wal")::numeric),
+    ('v7', $(cat "$WORKDIR/v7.wal")::numeric)
+) b(pk, wal_bytes);
+
+SELECT EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'pgstattuple') as has_pgstattuple \gset
+\if :has_pgstattuple
+SELECT 'v4' as pk, avg_leaf_density, leaf_fragmentation FROM pgstatindex('$SCHEMA.v4_pkey')
+UNION ALL
+SELECT 'v7', avg_leaf_density, leaf_fragmentation FROM pgstatindex('$SCHEMA.v7_pkey');
+\else
+\echo 'Gustoća listova: CREATE EXTENSION pgstattuple'
+\endif
+EOF
@@ -282,4 +282,196 @@ END;
 $$ LANGUAGE plpgsql;
 
 COMMENT ON FUNCTION verify_password(TEXT, TEXT) 
-IS 'Provjerava da li plain_password odgovara hashiranoj lozinci';
\ No newline at end of file
+IS 'Provjerava da li plain_password odgovara hashiranoj lozinci';
+
+CREATE OR REPLACE FUNCTION rate_limit_take(
+    p_key VARCHAR,
+    p_capacity DOUBLE PRECISION,
+    p_refill_rate DOUBLE PRECISION
+)
+RETURNS TABLE(allowed BOOLEAN, retry_after DOUBLE PRECISION) AS $$
+DECLARE
+    v_tokens DOUBLE PRECISION;
+BEGIN
+    INSERT INTO rate_limit_buckets (bucket_key, tokens, updated_at)
+    VALUES (p_key, p_capacity, clock_timestamp())
+    ON CONFLICT (bucket_key) DO UPDATE
+    SET tokens = LEAST(
+            p_capacity,
+            rate_limit_buckets.tokens +
+            EXTRACT(EPOCH FROM (clock_timestamp() - rate_limit_buckets.updated_at)) * p_refill_rate
+        ),
+        updated_at = clock_timestamp()
+    RETURNING tokens INTO v_tokens;
+
+    IF v_tokens >= 1 THEN
+        UPDATE rate_limit_buckets
+        SET tokens = tokens - 1
+        WHERE bucket_key = p_key;
+
+        RETURN QUERY SELECT true, 0::DOUBLE PRECISION;
+    ELSE
+        RETURN QUERY SELECT false, (1 - v_tokens) / p_refill_rate;
+    END IF;
+END;
+$$ LANGUAGE plpgsql;
+
+COMMENT ON FUNCTION rate_limit_take(VARCHAR, DOUBLE PRECISION, DOUBLE PRECISION) 
+IS 'Token bucket - uzima jedan token za ključ, vraća dopušteno i za koliko sekundi ponoviti';
+
+
+CREATE OR REPLACE FUNCTION clean_rate_limit_buckets()
+RETURNS INT AS $$
+DECLARE
+    v_deleted_count INT;
+BEGIN
+    DELETE FROM rate_limit_buckets
+    WHERE updated_at < CURRENT_TIMESTAMP - INTERVAL '1 hour';
+    
+    GET DIAGNOSTICS v_deleted_count = ROW_COUNT;
+    
+    RETURN v_deleted_count;
+END;
+$$ LANGUAGE plpgsql;
+
+COMMENT ON FUNCTION clean_rate_limit_buckets() 
+IS 'Briše rate limit stanja neaktivna duže od sat vremena';
+
+
+CREATE OR REPLACE FUNCTION clean_idempotency_keys()
+RETURNS INT AS $$
+DECLARE
+    v_deleted_count INT;
+BEGIN
+    DELETE FROM idempotency_keys
+    WHERE expires_at < CURRENT_TIMESTAMP;
+    
+    GET DIAGNOSTICS v_deleted_count = ROW_COUNT;
+    
+    RETURN v_deleted_count;
+END;
+$$ LANGUAGE plpgsql;
+
+COMMENT ON FUNCTION clean_idempotency_keys() 
+IS 'Briše istekle idempotency ključeve';
+
+
+CREATE OR REPLACE FUNCTION is_archiving()
+RETURNS BOOLEAN AS $$
+BEGIN
+    RETURN COALESCE(current_setting('autoservis.archiving', true), '') = 'on';
+END;
+$$ LANGUAGE plpgsql STABLE;
+
+COMMENT ON FUNCTION is_archiving() 
+IS 'True dok transakcija premješta podatke u/iz arhive - triggeri tada preskaču audit i obavijesti';
+
+
+CREATE OR REPLACE FUNCTION archive_work_orders(
+    p_older_than INTERVAL,
+    p_batch_size INT DEFAULT 500
+)
+RETURNS INT AS $$
+DECLARE
+    v_ids UUID[];
+BEGIN
+    IF p_older_than <= INTERVAL '0' OR p_batch_size < 1 THEN
+        RAISE EXCEPTION 'Archive age and batch size must be positive (got %, %)', p_older_than, p_batch_size;
+    END IF;
+
+    PERFORM set_config('autoservis.archiving', 'on', true);
+
+    -- Završeni nalozi bez računa ili s plaćenim računom
+    SELECT ARRAY_AGG(work_order_id) INTO v_ids
+    FROM (
+        SELECT wo.work_order_id
+        FROM work_orders wo
+        LEFT JOIN invoices i ON i.work_order_id = wo.work_order_id
+        WHERE wo.status = 'completed'
+          AND wo.completed_at < CURRENT_TIMESTAMP - p_older_than
+          AND (i.invoice_id IS NULL OR i.status = 'paid')
+        ORDER BY wo.completed_at
+        LIMIT p_batch_size
+        FOR UPDATE OF wo SKIP LOCKED
+    ) batch;
+
+    IF v_ids IS NULL THEN
+        PERFORM set_config('autoservis.archiving', 'off', true);
+        RETURN 0;
+    END IF;
+
+    INSERT INTO work_orders_archive
+    SELECT wo.*, CURRENT_TIMESTAMP FROM work_orders wo WHERE wo.work_order_id = ANY(v_ids);
+
+    INSERT INTO work_log_archive
+    SELECT wl.*, CURRENT_TIMESTAMP FROM work_log wl WHERE wl.work_order_id = ANY(v_ids);
+
+    INSERT INTO invoices_archive
+    SELECT i.*, CURRENT_TIMESTAMP FROM invoices i WHERE i.work_order_id = ANY(v_ids);
+
+    DELETE FROM invoices WHERE work_order_id = ANY(v_ids);
+    DELETE FROM work_log WHERE work_order_id = ANY(v_ids);
+    DELETE FROM work_orders WHERE work_order_id = ANY(v_ids);
+
+    INSERT INTO audit_log (action_type, table_name, new_value, ip_address)
+    VALUES ('ARCHIVE', 'work_orders',
+            jsonb_build_object('count', array_length(v_ids, 1), 'older_than', p_older_than::TEXT),
+            inet_client_addr());
+
+    PERFORM set_config('autoservis.archiving', 'off', true);
+
+    RETURN array_length(v_ids, 1);
+END;
+$$ LANGUAGE plpgsql;
+
+COMMENT ON FUNCTION archive_work_orders(INTERVAL, INT) 
+IS 'Premješta jednu seriju starih završenih naloga, njihovih zapisa i plaćenih računa u arhivu';
+
+
+CREATE OR REPLACE FUNCTION restore_archived_work_order(p_work_order_id UUID, p_restored_by UUID)
+RETURNS BOOLEAN AS $$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM work_orders_archive WHERE work_order_id = p_work_order_id) THEN
+        RETURN false;
+    END IF;
+
+    PERFORM set_config('autoservis.archiving', 'on', true);
+
+    INSERT INTO work_orders (
+        work_order_id, vehicle_id, created_by, assigned_mechanic_id, status, description,
+        estimated_cost, actual_cost, work_details, created_at, started_at, completed_at
+    )
+    SELECT work_order_id, vehicle_id, created_by, assigned_mechanic_id, status, description,
+           estimated_cost, actual_cost, work_details, created_at, started_at, completed_at
+    FROM work_orders_archive
+    WHERE work_order_id = p_work_order_id;
+
+    INSERT INTO work_log (log_id, work_order_id, mechanic_id, log_entry, hours_worked, timestamp)
+    SELECT log_id, work_order_id, mechanic_id, log_entry, hours_worked, timestamp
+    FROM work_log_archive
+    WHERE work_order_id = p_work_order_id;
+
+    INSERT INTO invoices (
+        invoice_id, work_order_id, customer_id, created_by, invoice_number,
+        total_amount, tax_amount, status, issued_at, paid_at
+    )
+    SELECT invoice_id, work_order_id, customer_id, created_by, invoice_number,
+           total_amount, tax_amount, status, issued_at, paid_at
+    FROM invoices_archive
+    WHERE work_order_id = p_work_order_id;
+
+    DELETE FROM invoices_archive WHERE work_order_id = p_work_order_id;
+    DELETE FROM work_log_archive WHERE work_order_id = p_work_order_id;
+    DELETE FROM work_orders_archive WHERE work_order_id = p_work_order_id;
+
+    INSERT INTO audit_log (user_id, action_type, table_name, record_id, ip_address)
+    VALUES (p_restored_by, 'RESTORE', 'work_orders', p_work_order_id, inet_client_addr());
+
+    PERFORM set_config('autoservis.archiving', 'off', true);
+
+    RETURN true;
+END;
+$$ LANGUAGE plpgsql;
+
+COMMENT ON FUNCTION restore_archived_work_order(UUID, UUID) 
+IS 'Vraća arhivirani radni nalog, njegove zapise i račun u aktivne tablice';
@@ -0,0 +1,39 @@
+-- Migracija postojeće baze na vremenski poredane primarne ključeve (UUIDv7).
+-- Tip stupaca ostaje UUID, pa postojeći v4 ključevi i strani ključevi ostaju
+-- valjani - mijenja se samo DEFAULT za nove zapise.
+--
+-- psql -d autoservis -f database/migrations/uuid_v7_primary_keys.sql
+
+BEGIN;
+
+CREATE OR REPLACE FUNCTION uuid_generate_v7()
+RETURNS UUID AS $$
+DECLARE
+    v_unix_ms BIGINT := (EXTRACT(EPOCH FROM clock_timestamp()) * 1000)::BIGINT;
+    v_bytes BYTEA := gen_random_bytes(16);
+BEGIN
+    -- 48 bita milisekundi, zatim verzija 7 i RFC 4122 varijanta, ostatak nasumičan
+    v_bytes := overlay(v_bytes PLACING substring(int8send(v_unix_ms) FROM 3) FROM 1 FOR 6);
+    v_bytes := set_byte(v_bytes, 6, (b'0111' || get_byte(v_bytes, 6)::BIT(4))::BIT(8)::INT);
+    v_bytes := set_byte(v_bytes, 8, (b'10' || get_byte(v_bytes, 8)::BIT(6))::BIT(8)::INT);
+    RETURN encode(v_bytes, 'hex')::UUID;
+END;
+$$ LANGUAGE plpgsql VOLATILE;
+
+COMMENT ON FUNCTION uuid_generate_v7()
+IS 'UUIDv7 - vremenski poredani UUID, novi zapisi idu na kraj B-tree indeksa';
+
+ALTER TABLE vehicles ALTER COLUMN vehicle_id SET DEFAULT uuid_generate_v7();
+ALTER TABLE work_orders ALTER COLUMN work_order_id SET DEFAULT uuid_generate_v7();
+ALTER TABLE invoices ALTER COLUMN invoice_id SET DEFAULT uuid_generate_v7();
+ALTER TABLE sessions ALTER COLUMN session_id SET DEFAULT uuid_generate_v7();
+
+COMMIT;
+
+-- Postojeći indeksi su fragmentirani nasumičnim v4 ključevima; nakon migracije
+-- ih se može jednokratno sažeti (ne blokira pisanje):
+--
+-- REINDEX INDEX CONCURRENTLY work_orders_pkey;
+-- REINDEX INDEX CONCURRENTLY vehicles_pkey;
+-- REINDEX INDEX CONCURRENTLY invoices_pkey;
+-- REINDEX INDEX CONCURRENTLY sessions_pkey;
@@ -3,6 +3,26 @@ CREATE SCHEMA public;
 
 CREATE EXTENSION IF NOT EXISTS "uuid-ossp";
 CREATE EXTENSION IF NOT EXISTS "pgcrypto";
+CREATE EXTENSION IF NOT EXISTS "pg_trgm";
+
+-- funkcije potrebne za DEFAULT vrijednosti
+
+CREATE OR REPLACE FUNCTION uuid_generate_v7()
+RETURNS UUID AS $$
+DECLARE
+    v_unix_ms BIGINT := (EXTRACT(EPOCH FROM clock_timestamp()) * 1000)::BIGINT;
+    v_bytes BYTEA := gen_random_bytes(16);
+BEGIN
+    -- 48 bita milisekundi, zatim verzija 7 i RFC 4122 varijanta, ostatak nasumičan
+    v_bytes := overlay(v_bytes PLACING substring(int8send(v_unix_ms) FROM 3) FROM 1 FOR 6);
+    v_bytes := set_byte(v_bytes, 6, (b'0111' || get_byte(v_bytes, 6)::BIT(4))::BIT(8)::INT);
+    v_bytes := set_byte(v_bytes, 8, (b'10' || get_byte(v_bytes, 8)::BIT(6))::BIT(8)::INT);
+    RETURN encode(v_bytes, 'hex')::UUID;
+END;
+$$ LANGUAGE plpgsql VOLATILE;
+
+COMMENT ON FUNCTION uuid_generate_v7()
+IS 'UUIDv7 - vremenski poredani UUID, novi zapisi idu na kraj B-tree indeksa';
 
 -- enum tipovi
 
@@ -120,7 +140,7 @@ COMMENT ON TABLE role_permissions IS 'Koje uloge imaju koje dozvole';
 
 
 CREATE TABLE vehicles (
-    vehicle_id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+    vehicle_id UUID PRIMARY KEY DEFAULT uuid_generate_v7(),
     owner_id UUID NOT NULL REFERENCES users(user_id) ON DELETE CASCADE,
     license_plate VARCHAR(20) UNIQUE NOT NULL,
     brand VARCHAR(50) NOT NULL,
@@ -139,7 +159,7 @@ COMMENT ON COLUMN vehicles.metadata IS 'JSONB - kilometraža, boja, dodatne spec
 
 
 CREATE TABLE work_orders (
-    work_order_id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+    work_order_id UUID PRIMARY KEY DEFAULT uuid_generate_v7(),
     vehicle_id UUID NOT NULL REFERENCES vehicles(vehicle_id) ON DELETE CASCADE,
     created_by UUID NOT NULL REFERENCES users(user_id) ON DELETE RESTRICT,
     assigned_mechanic_id UUID REFERENCES users(user_id) ON DELETE SET NULL,
@@ -183,7 +203,7 @@ CREATE TABLE work_log (
 COMMENT ON TABLE work_log IS 'Zapisi mehaničara tijekom rada';
 
 CREATE TABLE invoices (
-    invoice_id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+    invoice_id UUID PRIMARY KEY DEFAULT uuid_generate_v7(),
     work_order_id UUID UNIQUE NOT NULL REFERENCES work_orders(work_order_id) ON DELETE RESTRICT,
     customer_id UUID NOT NULL REFERENCES users(user_id) ON DELETE RESTRICT,
     created_by UUID REFERENCES users(user_id) ON DELETE SET NULL,
@@ -203,7 +223,7 @@ COMMENT ON COLUMN invoices.invoice_number IS 'Jedinstveni broj računa (npr. INV
 
 
 CREATE TABLE sessions (
-    session_id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+    session_id UUID PRIMARY KEY DEFAULT uuid_generate_v7(),
     user_id UUID NOT NULL REFERENCES users(user_id) ON DELETE CASCADE,
     ip_address INET NOT NULL,
     user_agent TEXT,
@@ -233,6 +253,58 @@ COMMENT ON TABLE audit_log IS 'Dnevnik svih promjena - tko, što, kada';
 COMMENT ON COLUMN audit_log.old_value IS 'Stara vrijednost zapisa (prije promjene)';
 COMMENT ON COLUMN audit_log.new_value IS 'Nova vrijednost zapisa (nakon promjene)';
 
+-- arhiva (hladni podaci)
+
+CREATE TABLE work_orders_archive (
+    LIKE work_orders,
+    archived_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP NOT NULL,
+
+    PRIMARY KEY (work_order_id)
+);
+
+COMMENT ON TABLE work_orders_archive IS 'Arhivirani završeni radni nalozi - premješteni iz work_orders';
+
+
+CREATE TABLE work_log_archive (
+    LIKE work_log,
+    archived_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP NOT NULL,
+
+    PRIMARY KEY (log_id)
+);
+
+COMMENT ON TABLE work_log_archive IS 'Zapisi mehaničara za arhivirane radne naloge';
+
+
+CREATE TABLE invoices_archive (
+    LIKE invoices,
+    archived_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP NOT NULL,
+
+    PRIMARY KEY (invoice_id)
+);
+
+COMMENT ON TABLE invoices_archive IS 'Plaćeni računi arhiviranih radnih naloga';
+
+
+CREATE UNLOGGED TABLE rate_limit_buckets (
+    bucket_key VARCHAR(200) PRIMARY KEY,
+    tokens DOUBLE PRECISION NOT NULL,
+    updated_at TIMESTAMP NOT NULL
+);
+
+COMMENT ON TABLE rate_limit_buckets IS 'Token bucket stanje za rate limiting dijeljeno između workera (UNLOGGED)';
+
+CREATE TABLE idempotency_keys (
+    idempotency_key VARCHAR(300) PRIMARY KEY,
+    fingerprint VARCHAR(64) NOT NULL,
+    status_code INTEGER,
+    response_body TEXT,
+    content_type VARCHAR(100),
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    expires_at TIMESTAMP NOT NULL
+);
+
+COMMENT ON TABLE idempotency_keys IS 'Idempotency-Key -> otisak zahtjeva i spremljeni odgovor (status_code NULL = u obradi)';
+
 -- INDEXES - Indeksi za performanse
 
 -- Users
@@ -240,6 +312,12 @@ CREATE INDEX idx_users_email ON users(email);
 CREATE INDEX idx_users_username ON users(username);
 CREATE INDEX idx_users_status ON users(status);
 CREATE INDEX idx_users_metadata ON users USING gin(metadata);
+CREATE INDEX idx_users_username_trgm ON users USING gin(username gin_trgm_ops);
+CREATE INDEX idx_users_email_trgm ON users USING gin(email gin_trgm_ops);
+CREATE INDEX idx_users_phone_trgm ON users USING gin(phone gin_trgm_ops);
+
+-- Idempotency keys
+CREATE INDEX idx_idempotency_keys_expires ON idempotency_keys(expires_at);
 
 -- Roles
 CREATE INDEX idx_roles_parent ON roles(parent_role_id);
@@ -257,6 +335,9 @@ CREATE INDEX idx_role_permissions_permission ON role_permissions(permission_id);
 CREATE INDEX idx_vehicles_owner ON vehicles(owner_id);
 CREATE INDEX idx_vehicles_license_plate ON vehicles(license_plate);
 CREATE INDEX idx_vehicles_metadata ON vehicles USING gin(metadata);
+CREATE INDEX idx_vehicles_license_plate_trgm ON vehicles USING gin(license_plate gin_trgm_ops);
+CREATE INDEX idx_vehicles_vin_trgm ON vehicles USING gin(vin gin_trgm_ops);
+CREATE INDEX idx_vehicles_brand_model_trgm ON vehicles USING gin((brand || ' ' || model) gin_trgm_ops);
 
 -- Work Orders
 CREATE INDEX idx_work_orders_vehicle ON work_orders(vehicle_id);
@@ -264,7 +345,9 @@ CREATE INDEX idx_work_orders_status ON work_orders(status);
 CREATE INDEX idx_work_orders_created_by ON work_orders(created_by);
 CREATE INDEX idx_work_orders_mechanic ON work_orders(assigned_mechanic_id);
 CREATE INDEX idx_work_orders_created_at ON work_orders(created_at);
+CREATE INDEX idx_work_orders_completed ON work_orders(completed_at) WHERE status = 'completed';
 CREATE INDEX idx_work_orders_details ON work_orders USING gin(work_details);
+CREATE INDEX idx_work_orders_description_trgm ON work_orders USING gin(description gin_trgm_ops);
 
 -- Work Log
 CREATE INDEX idx_work_log_order ON work_log(work_order_id);
@@ -277,14 +360,24 @@ CREATE INDEX idx_invoices_customer ON invoices(customer_id);
 CREATE INDEX idx_invoices_status ON invoices(status);
 CREATE INDEX idx_invoices_number ON invoices(invoice_number);
 
+-- Archive
+CREATE INDEX idx_work_orders_archive_vehicle ON work_orders_archive(vehicle_id, completed_at DESC);
+CREATE INDEX idx_work_orders_archive_completed ON work_orders_archive(completed_at DESC, work_order_id DESC);
+CREATE INDEX idx_work_orders_archive_mechanic ON work_orders_archive(assigned_mechanic_id);
+CREATE INDEX idx_work_log_archive_order ON work_log_archive(work_order_id);
+CREATE INDEX idx_invoices_archive_work_order ON invoices_archive(work_order_id);
+CREATE INDEX idx_invoices_archive_customer ON invoices_archive(customer_id);
+
 -- Sessions
 CREATE INDEX idx_sessions_user ON sessions(user_id);
 CREATE INDEX idx_sessions_active ON sessions(is_active);
 CREATE INDEX idx_sessions_expires ON sessions(expires_at);
 
 -- Audit Log
-CREATE INDEX idx_audit_log_user ON audit_log(user_id);
-CREATE INDEX idx_audit_log_table ON audit_log(table_name);
-CREATE INDEX idx_audit_log_timestamp ON audit_log(timestamp);
+CREATE INDEX idx_audit_log_timestamp ON audit_log(timestamp DESC, log_id DESC);
+CREATE INDEX idx_audit_log_user ON audit_log(user_id, timestamp DESC, log_id DESC);
+CREATE INDEX idx_audit_log_table ON audit_log(table_name, timestamp DESC, log_id DESC);
+CREATE INDEX idx_audit_log_record ON audit_log(record_id, timestamp DESC, log_id DESC);
+CREATE INDEX idx_audit_log_action ON audit_log(action_type, timestamp DESC, log_id DESC);
 CREATE INDEX idx_audit_log_old_value ON audit_log USING gin(old_value);
 CREATE INDEX idx_audit_log_new_value ON audit_log USING gin(new_value);
\ No newline at end of file
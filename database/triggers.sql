@@ -80,6 +80,11 @@ CREATE TRIGGER users_audit_delete
 CREATE OR REPLACE FUNCTION audit_work_orders()
 RETURNS TRIGGER AS $$
 BEGIN
+    -- Premještanje u/iz arhive bilježi se jednim zapisom u archive_work_orders
+    IF is_archiving() THEN
+        RETURN NULL;
+    END IF;
+
     IF (TG_OP = 'INSERT') THEN
         INSERT INTO audit_log (user_id, action_type, table_name, record_id, new_value, ip_address)
         VALUES (NEW.created_by, 'INSERT', 'work_orders', NEW.work_order_id, to_jsonb(NEW), inet_client_addr());
@@ -166,6 +171,11 @@ RETURNS TRIGGER AS $$
 DECLARE
     v_is_mechanic BOOLEAN;
 BEGIN
+    -- Vraćanje iz arhive zadržava izvornog mehaničara
+    IF is_archiving() THEN
+        RETURN NEW;
+    END IF;
+
     IF NEW.assigned_mechanic_id IS NOT NULL THEN
         SELECT EXISTS (
             SELECT 1
@@ -268,3 +278,127 @@ CREATE TRIGGER session_update_last_login
 
 COMMENT ON TRIGGER session_update_last_login ON sessions 
 IS 'Ažurira last_login timestamp pri novoj prijavi';
+
+
+CREATE OR REPLACE FUNCTION notify_work_order_change()
+RETURNS TRIGGER AS $$
+DECLARE
+    v_row work_orders;
+    v_customer_id UUID;
+BEGIN
+    IF is_archiving() THEN
+        RETURN NULL;
+    END IF;
+
+    IF (TG_OP = 'DELETE') THEN
+        v_row := OLD;
+    ELSE
+        v_row := NEW;
+    END IF;
+
+    SELECT owner_id INTO v_customer_id
+    FROM vehicles
+    WHERE vehicle_id = v_row.vehicle_id;
+
+    PERFORM pg_notify('autoservis_events', json_build_object(
+        'table', 'work_orders',
+        'op', TG_OP,
+        'work_order_id', v_row.work_order_id,
+        'status', v_row.status,
+        'mechanic_id', v_row.assigned_mechanic_id,
+        'customer_id', v_customer_id
+    )::text);
+
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER work_orders_notify
+    AFTER INSERT OR UPDATE OR DELETE ON work_orders
+    FOR EACH ROW
+    EXECUTE FUNCTION notify_work_order_change();
+
+COMMENT ON TRIGGER work_orders_notify ON work_orders 
+IS 'Šalje NOTIFY autoservis_events pri svakoj promjeni radnog naloga';
+
+
+CREATE OR REPLACE FUNCTION notify_work_log_change()
+RETURNS TRIGGER AS $$
+DECLARE
+    v_row work_log;
+    v_mechanic_id UUID;
+    v_customer_id UUID;
+BEGIN
+    IF is_archiving() THEN
+        RETURN NULL;
+    END IF;
+
+    IF (TG_OP = 'DELETE') THEN
+        v_row := OLD;
+    ELSE
+        v_row := NEW;
+    END IF;
+
+    SELECT wo.assigned_mechanic_id, v.owner_id
+    INTO v_mechanic_id, v_customer_id
+    FROM work_orders wo
+    JOIN vehicles v ON wo.vehicle_id = v.vehicle_id
+    WHERE wo.work_order_id = v_row.work_order_id;
+
+    PERFORM pg_notify('autoservis_events', json_build_object(
+        'table', 'work_log',
+        'op', TG_OP,
+        'log_id', v_row.log_id,
+        'work_order_id', v_row.work_order_id,
+        'mechanic_id', v_mechanic_id,
+        'customer_id', v_customer_id
+    )::text);
+
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER work_log_notify
+    AFTER INSERT OR UPDATE OR DELETE ON work_log
+    FOR EACH ROW
+    EXECUTE FUNCTION notify_work_log_change();
+
+COMMENT ON TRIGGER work_log_notify ON work_log 
+IS 'Šalje NOTIFY autoservis_events pri svakom zapisu mehaničara';
+
+
+CREATE OR REPLACE FUNCTION notify_invoice_change()
+RETURNS TRIGGER AS $$
+DECLARE
+    v_row invoices;
+BEGIN
+    IF is_archiving() THEN
+        RETURN NULL;
+    END IF;
+
+    IF (TG_OP = 'DELETE') THEN
+        v_row := OLD;
+    ELSE
+        v_row := NEW;
+    END IF;
+
+    PERFORM pg_notify('autoservis_events', json_build_object(
+        'table', 'invoices',
+        'op', TG_OP,
+        'invoice_id', v_row.invoice_id,
+        'work_order_id', v_row.work_order_id,
+        'status', v_row.status,
+        'customer_id', v_row.customer_id
+    )::text);
+
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER invoices_notify
+    AFTER INSERT OR UPDATE OR DELETE ON invoices
+    FOR EACH ROW
+    EXECUTE FUNCTION notify_invoice_change();
+
+COMMENT ON TRIGGER invoices_notify ON invoices 
+IS 'Šalje NOTIFY autoservis_events pri svakoj promjeni računa';
@@ -168,7 +168,12 @@ SELECT
     COUNT(DISTINCT wo.assigned_mechanic_id) as mechanics_worked,
     COALESCE(SUM(wl.hours_worked), 0) as total_hours
 FROM work_orders wo
-LEFT JOIN work_log wl ON wo.work_order_id = wl.work_order_id
+-- Sati se zbrajaju po nalogu prije spajanja, inače se actual_cost broji jednom po zapisu
+LEFT JOIN (
+    SELECT work_order_id, SUM(hours_worked) as hours_worked
+    FROM work_log
+    GROUP BY work_order_id
+) wl ON wo.work_order_id = wl.work_order_id
 WHERE wo.status = 'completed' 
   AND wo.completed_at IS NOT NULL
 GROUP BY DATE(wo.completed_at)
@@ -256,7 +261,11 @@ SELECT
     
 FROM work_orders wo
 JOIN vehicles v ON wo.vehicle_id = v.vehicle_id
-LEFT JOIN work_log wl ON wo.work_order_id = wl.work_order_id
+LEFT JOIN (
+    SELECT work_order_id, SUM(hours_worked) as hours_worked
+    FROM work_log
+    GROUP BY work_order_id
+) wl ON wo.work_order_id = wl.work_order_id
 WHERE wo.status = 'completed' 
   AND wo.completed_at IS NOT NULL
 GROUP BY DATE_TRUNC('month', wo.completed_at)
@@ -309,3 +318,37 @@ ORDER BY s.created_at DESC;
 
 COMMENT ON VIEW active_sessions 
 IS 'Sve trenutno aktivne sesije';
+
+
+CREATE OR REPLACE VIEW work_orders_archive_detailed AS
+SELECT 
+    wo.work_order_id,
+    wo.status,
+    wo.description,
+    wo.estimated_cost,
+    wo.actual_cost,
+    wo.created_at,
+    wo.started_at,
+    wo.completed_at,
+    wo.archived_at,
+
+    wo.vehicle_id,
+    v.license_plate,
+    v.brand,
+    v.model,
+    v.year,
+
+    customer.user_id as customer_id,
+    customer.username as customer_name,
+    customer.email as customer_email,
+
+    mechanic.user_id as mechanic_id,
+    mechanic.username as mechanic_name
+    
+FROM work_orders_archive wo
+LEFT JOIN vehicles v ON wo.vehicle_id = v.vehicle_id
+LEFT JOIN users customer ON v.owner_id = customer.user_id
+LEFT JOIN users mechanic ON wo.assigned_mechanic_id = mechanic.user_id;
+
+COMMENT ON VIEW work_orders_archive_detailed 
+IS 'Arhivirani radni nalozi s vozilom, klijentom i mehaničarem (vozilo je možda obrisano)';
@@ -4,6 +4,7 @@ import { getAuditLog } from '../services/api';
 export default function AuditLog() {
   const [logs, setLogs] = useState([]);
   const [loading, setLoading] = useState(true);
+  const [nextCursor, setNextCursor] = useState(null);
   const [filters, setFilters] = useState({
     table_name: '',
     action_type: '',
@@ -14,15 +15,17 @@ export default function AuditLog() {
     fetchLogs();
   }, []);
 
-  const fetchLogs = async () => {
+  const fetchLogs = async (cursor = null) => {
     try {
       const params = {};
       if (filters.table_name) params.table_name = filters.table_name;
       if (filters.action_type) params.action_type = filters.action_type;
+      if (cursor) params.cursor = cursor;
       params.limit = filters.limit;
 
       const response = await getAuditLog(params);
-      setLogs(response.data);
+      setLogs(prev => cursor ? [...prev, ...response.data.items] : response.data.items);
+      setNextCursor(response.data.next_cursor);
     } catch (error) {
       console.error('Failed to fetch audit log', error);
     } finally {
@@ -183,6 +186,14 @@ export default function AuditLog() {
             Nema zapisa za prikaz
           </div>
         )}
+
+        {nextCursor && (
+          <div className="text-center pt-4">
+            <button onClick={() => fetchLogs(nextCursor)} className="btn-secondary">
+              Učitaj još
+            </button>
+          </div>
+        )}
       </div>
 
       <div className="grid grid-cols-1 md:grid-cols-3 gap-4">
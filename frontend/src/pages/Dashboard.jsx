@@ -1,7 +1,9 @@
 import { useState, useEffect } from 'react';
-import { getDashboardStats, getCustomerDashboard, getMechanicDashboard } from '../services/api';
+import { getDashboardStats, getCustomerDashboard, getMechanicDashboard, subscribeEvents } from '../services/api';
 import { useAuth } from '../context/AuthContext';
 
+const STATS_REFRESH_MS = 5000;
+
 export default function Dashboard() {
   const [stats, setStats] = useState(null);
   const [loading, setLoading] = useState(true);
@@ -11,16 +13,20 @@ export default function Dashboard() {
     fetchStats();
   }, [user]);
 
-  const fetchStats = async () => {
+  // Statistika su zbrojevi - dovoljno je osvježiti jednom po seriji, a serije
+  // su rijetke da dashboard ostane u 'heavy' rate limitu
+  useEffect(() => subscribeEvents(() => fetchStats(true), STATS_REFRESH_MS), [user]);
+
+  const fetchStats = async (primary = false) => {
     try {
       if (user?.roles?.includes('customer') && !user?.roles?.includes('owner')) {
-        const response = await getCustomerDashboard();
+        const response = await getCustomerDashboard(primary);
         setStats({ type: 'customer', data: response.data });
       } else if (user?.roles?.includes('mechanic') && !user?.roles?.some(r => ['owner', 'head_mechanic'].includes(r))) {
-        const response = await getMechanicDashboard();
+        const response = await getMechanicDashboard(primary);
         setStats({ type: 'mechanic', data: response.data });
       } else {
-        const response = await getDashboardStats();
+        const response = await getDashboardStats(primary);
         setStats({ type: 'admin', data: response.data });
       }
     } catch (error) {
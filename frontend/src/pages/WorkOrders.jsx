@@ -1,4 +1,4 @@
-import { useState, useEffect } from 'react';
+import { useState, useEffect, useRef } from 'react';
 import { useAuth } from '../context/AuthContext';
 import { 
   getWorkOrders, 
@@ -8,7 +8,8 @@ import {
   assignMechanic,
   addWorkLog,
   getVehicles,
-  getMechanics 
+  getMechanics,
+  subscribeEvents
 } from '../services/api';
 import Modal from '../components/Modal';
 
@@ -41,9 +42,67 @@ export default function WorkOrders() {
     fetchMechanics();
   }, []);
 
-  const fetchOrders = async () => {
+  const ordersRef = useRef(orders);
+  const mechanicsRef = useRef(mechanics);
+  const selectedOrderRef = useRef(selectedOrder);
+  const detailOpenRef = useRef(isDetailModalOpen);
+  ordersRef.current = orders;
+  mechanicsRef.current = mechanics;
+  selectedOrderRef.current = selectedOrder;
+  detailOpenRef.current = isDetailModalOpen;
+
+  // Promjene statusa, mehaničara i računa upisuju se u postojeću listu;
+  // cijela lista se učitava samo za resync, nove/obrisane ili nepoznate naloge
+  const handleEvents = (events) => {
+    const known = new Set(ordersRef.current.map(o => o.work_order_id));
+    const orderEvents = events.filter(e => e.table === 'work_orders');
+
+    const selected = selectedOrderRef.current;
+    if (detailOpenRef.current && selected && events.some(e => e.work_order_id === selected.work_order_id)) {
+      getWorkOrder(selected.work_order_id, true)
+        .then(response => setSelectedOrder(response.data))
+        .catch(error => console.error('Greška pri učitavanju detalja:', error));
+    }
+
+    if (events.some(e => e.table === 'resync') ||
+        orderEvents.some(e => e.op !== 'UPDATE' || !known.has(e.work_order_id))) {
+      fetchOrders(true);
+      return;
+    }
+
+    const updates = new Map(orderEvents.map(e => [e.work_order_id, e]));
+    const invoiced = new Set(
+      events.filter(e => e.table === 'invoices' && e.op !== 'DELETE').map(e => e.work_order_id)
+    );
+    if (!updates.size && !invoiced.size) {
+      return;
+    }
+
+    setOrders(current => current.map(order => {
+      const update = updates.get(order.work_order_id);
+      if (!update && !invoiced.has(order.work_order_id)) {
+        return order;
+      }
+      const next = { ...order };
+      if (update) {
+        next.status = update.status;
+        if (update.mechanic_id !== order.mechanic_id) {
+          next.mechanic_id = update.mechanic_id;
+          next.mechanic_name = mechanicsRef.current.find(m => m.user_id === update.mechanic_id)?.username || null;
+        }
+      }
+      if (invoiced.has(order.work_order_id)) {
+        next.has_invoice = true;
+      }
+      return next;
+    }));
+  };
+
+  useEffect(() => subscribeEvents((events) => handleEvents(events)), []);
+
+  const fetchOrders = async (primary = false) => {
     try {
-      const response = await getWorkOrders();
+      const response = await getWorkOrders(primary);
       setOrders(response.data);
     } catch (error) {
       console.error('Failed to fetch work orders', error);
@@ -14,43 +14,124 @@ api.interceptors.request.use((config) => {
   return config;
 });
 
+// Isti ključ pri ponovnom slanju - poslužitelj vraća spremljeni odgovor umjesto novog zapisa
+// crypto.randomUUID postoji samo u sigurnom kontekstu (HTTPS/localhost), getRandomValues svugdje
+const randomKey = () => {
+  if (crypto.randomUUID) {
+    return crypto.randomUUID();
+  }
+  const bytes = crypto.getRandomValues(new Uint8Array(16));
+  bytes[6] = (bytes[6] & 0x0f) | 0x40;
+  bytes[8] = (bytes[8] & 0x3f) | 0x80;
+  const hex = Array.from(bytes, (b) => b.toString(16).padStart(2, '0')).join('');
+  return `${hex.slice(0, 8)}-${hex.slice(8, 12)}-${hex.slice(12, 16)}-${hex.slice(16, 20)}-${hex.slice(20)}`;
+};
+
+const idempotent = () => ({ headers: { 'Idempotency-Key': randomKey() } });
+
+const IDEMPOTENT_RETRIES = 3;
+
+// Zahtjev s ključem koji nije dobio odgovor (mreža) ili se još obrađuje (409)
+// šalje se ponovno s istim configom - dakle istim Idempotency-Key
+api.interceptors.response.use(undefined, (error) => {
+  const config = error.config;
+  const retryable = !error.response || (error.response.status === 409 && error.response.headers['retry-after']);
+  if (!config || !config.headers['Idempotency-Key'] || !retryable) {
+    return Promise.reject(error);
+  }
+  config.retryCount = (config.retryCount || 0) + 1;
+  if (config.retryCount > IDEMPOTENT_RETRIES) {
+    return Promise.reject(error);
+  }
+  const delay = 500 * 2 ** (config.retryCount - 1);
+  return new Promise((resolve) => setTimeout(resolve, delay)).then(() => api(config));
+});
+
+// Čitanje potaknuto događajem ide na primary - replika možda još nije primijenila promjenu
+const readPrimary = (primary) => (primary ? { headers: { 'X-Read-Primary': '1' } } : {});
+
 export const login = (username, password) => 
   api.post('/auth/login', { username, password });
 export const getCurrentUser = () => api.get('/auth/me');
 
 export const getUsers = () => api.get('/users');
-export const createUser = (data) => api.post('/users', data);
+export const createUser = (data) => api.post('/users', data, idempotent());
 export const updateUser = (userId, data) => api.put(`/users/${userId}`, data);
 export const getUserPermissions = (userId) => api.get(`/users/${userId}/permissions`);
 
 export const getVehicles = () => api.get('/vehicles');
-export const createVehicle = (data) => api.post('/vehicles', data);
+export const createVehicle = (data) => api.post('/vehicles', data, idempotent());
 
-export const getWorkOrders = () => api.get('/work-orders');
-export const getWorkOrder = (id) => api.get(`/work-orders/${id}`);
-export const createWorkOrder = (data) => api.post('/work-orders', data);
+export const getWorkOrders = (primary = false) => api.get('/work-orders', readPrimary(primary));
+export const getWorkOrder = (id, primary = false) => api.get(`/work-orders/${id}`, readPrimary(primary));
+export const createWorkOrder = (data) => api.post('/work-orders', data, idempotent());
 export const updateWorkOrderStatus = (orderId, status) =>
   api.put(`/work-orders/${orderId}/status`, { status });
 export const assignMechanic = (orderId, mechanicId) =>
   api.put(`/work-orders/${orderId}/mechanic`, { mechanic_id: mechanicId });
 export const addWorkLog = (orderId, data) =>
-  api.post(`/work-orders/${orderId}/logs`, data);
+  api.post(`/work-orders/${orderId}/logs`, data, idempotent());
+export const autoAssignMechanic = (orderId) =>
+  api.post(`/work-orders/${orderId}/auto-assign`);
+export const autoAssignPending = () => api.post('/work-orders/auto-assign');
+
+export const getArchivedWorkOrders = (params) => api.get('/archive/work-orders', { params });
+export const getArchivedWorkOrder = (id) => api.get(`/archive/work-orders/${id}`);
+export const restoreArchivedWorkOrder = (id) => api.post(`/archive/work-orders/${id}/restore`);
+export const runArchival = (data) => api.post('/archive/run', data);
 
 export const getInvoices = () => api.get('/invoices');
 export const markInvoicePaid = (invoiceId) => api.put(`/invoices/${invoiceId}/pay`);
 
 export const getAuditLog = (params) => api.get('/audit-log', { params });
+export const getRecordHistory = (recordId, params) =>
+  api.get(`/audit-log/records/${recordId}`, { params });
 
 export const getSessions = () => api.get('/sessions');
 export const deleteSession = (sessionId) => api.delete(`/sessions/${sessionId}`);
 
 export const getRoles = () => api.get('/roles');
 
-export const getDashboardStats = () => api.get('/stats/dashboard');
-export const getCustomerDashboard = () => api.get('/stats/customer-dashboard');
-export const getMechanicDashboard = () => api.get('/stats/mechanic-dashboard');
+export const getDashboardStats = (primary = false) => api.get('/stats/dashboard', readPrimary(primary));
+export const getCustomerDashboard = (primary = false) =>
+  api.get('/stats/customer-dashboard', readPrimary(primary));
+export const getRevenueAnalytics = (params) => api.get('/analytics/revenue', { params });
+export const getMechanicDashboard = (primary = false) =>
+  api.get('/stats/mechanic-dashboard', readPrimary(primary));
 
 export const getMechanics = () => api.get('/mechanics');
+export const getMechanicsWorkload = () => api.get('/mechanics/workload');
 export const getCustomers = () => api.get('/customers');
 
+export const search = (q, limit) => api.get('/search', { params: { q, limit } });
+
+// Događaji se skupljaju i predaju u serijama najviše jednom po `delay` ms -
+// jedan UPDATE nad N naloga šalje N događaja, a ekran treba reagirati jednom
+export const subscribeEvents = (onEvents, delay = 500) => {
+  const token = localStorage.getItem('token');
+  const source = new EventSource(`${API_URL}/events?token=${encodeURIComponent(token)}`);
+  let pending = [];
+  let timer = null;
+
+  const flush = () => {
+    const batch = pending;
+    pending = [];
+    timer = null;
+    onEvents(batch);
+  };
+
+  ['work_orders', 'work_log', 'invoices', 'resync'].forEach((type) =>
+    source.addEventListener(type, (e) => {
+      pending.push(JSON.parse(e.data));
+      if (!timer) {
+        timer = setTimeout(flush, delay);
+      }
+    })
+  );
+  return () => {
+    clearTimeout(timer);
+    source.close();
+  };
+};
+
 export default api;
\ No newline at end of file